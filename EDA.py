@@ -1,294 +1,224 @@
 # extended_eda_static_interactive.py
 # Full EDA with Static (PNG), Interactive (HTML) Charts + Excel & Text Summary
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import openpyxl
-
-
-def find_column(df, possible_names):
-    """Helper to detect column name variations"""
-    for name in possible_names:
-        if name in df.columns:
-            return name
-    return None
+import argparse
+import os
 
+import pandas as pd
 
-def main():
-    file_path = "wellbeing_survey_res_Cleaned.csv"
-    df = pd.read_csv(file_path, encoding="utf-8")
+import eda_assoc
+import eda_charts
+import eda_engine
+import survey_rollups
+import survey_text
+from eda_cache import BuildCache, content_key, file_key
+from eda_charts import FORMATS, PLOTLY_JS, chart, render_charts
+from eda_engine import plan_sections, run_sections, run_trends, section, trend_section
+from survey_data import OPTIONS_FILE, SCHEMA_FILE, available_columns, cleaned_source, read_options, read_schema
+from survey_metrics import STRESS_SCORE_COL
+from survey_rollups import MEAN_METRICS, RESPONSES, ROLLUP_FILE, read_rollups
+from survey_trace import TRACE_FILE, configure as configure_trace, stage
+
+
+# ---------------------------
+# Report sections
+# ---------------------------
+# Adding a metric is one more entry here; all sections are aggregated
+# together in a single pass over the cleaned data. Trend sections read the
+# cleaner's daily/weekly rollups instead.
+SECTIONS = [
+    section("Age_Distribution", ["Age_Group", "Age", "Age (years)"],
+            summary="Most common age group: {top} ({top_count} respondents)",
+            chart=dict(name="eda_age_distribution", kind="bar", title="Age Distribution",
+                       label="Age", color="skyblue", figsize=(6, 4))),
+    section("Gender_Distribution", ["Gender", "gender"],
+            summary="Gender split: {counts}",
+            chart=dict(name="eda_gender_distribution", kind="pie", title="Gender Distribution",
+                       figsize=(5, 4))),
+    section("Role_Distribution", ["Role", "Primary role"],
+            summary="Most common role: {top} ({top_count} respondents)",
+            chart=dict(name="eda_role_distribution", kind="bar", title="Role Distribution",
+                       label="Role", color="orange", figsize=(7, 5))),
+    section("Country_Distribution", ["Country", "Country/Region"],
+            chart=dict(name="eda_country_distribution", kind="bar", title="Top 10 Countries",
+                       label="Country", color="teal", figsize=(8, 5)),
+            chart_top=10),
+    section("Stress_Distribution", ["Stress_Category", "Stress Level", "Stress"],
+            summary="Highest stress group: {top} ({top_count} respondents)",
+            chart=dict(name="eda_stress_distribution", kind="bar", title="Stress Level Distribution",
+                       label="Stress", color="salmon", figsize=(5, 4))),
+    section("Stress_By_Role", ["Stress_Category", "Stress Level", "Stress"], kind="crosstab",
+            by=["Role", "Primary role"],
+            chart=dict(name="eda_stress_by_role", kind="grouped", title="Stress Levels by Role",
+                       figsize=(7, 5))),
+    section("AI_Tool_Usage", ["Used_AI_Tool", "AI Tool Usage", "AI_Usage"],
+            summary="AI tool usage: {counts}",
+            chart=dict(name="eda_ai_tool_usage", kind="pie", title="AI Tool Usage (Yes/No)",
+                       figsize=(5, 4))),
+    section("App_Usage", ["Wellness_Apps", "Which wellness/mental health apps have you used in the last 6 months? (select all that apply)"],
+            kind="multi",
+            summary="Most popular app: {top} ({top_count} users)",
+            chart=dict(name="eda_app_usage", kind="bar", title="Wellness App Usage",
+                       label="App", color="blue", figsize=(7, 5))),
+    section("Concerns", ["Concerns_List", "Concerns", "Mental Health Concerns"], kind="split",
+            summary="Top concern: {top} ({top_count} respondents)",
+            chart=dict(name="eda_concerns", kind="bar", title="Top Reported Mental Health Concerns",
+                       label="Concern", color="purple", figsize=(7, 5))),
+    section("Desired_Features", ["Desired_Features", "Features", "Wanted Features"], kind="split",
+            summary="Most wanted feature: {top} ({top_count} requests)",
+            chart=dict(name="eda_features", kind="bar", title="Most Wanted Features",
+                       label="Feature", color="green", figsize=(7, 5), png_kind="barh")),
+    section("Wanted_Terms", ["What would you want from a wellbeing companion? (open text)"], kind="terms",
+            summary="Most mentioned in wishes for a companion: {top} ({top_count} responses)",
+            chart=dict(name="eda_wanted_terms", kind="bar", title="Top Terms: What Respondents Want",
+                       label="Term", color="green", figsize=(7, 5), png_kind="barh"),
+            chart_top=15),
+    section("Concern_Terms", ["Any concerns about such apps? (open text)"], kind="terms",
+            summary="Most mentioned in concerns: {top} ({top_count} responses)",
+            chart=dict(name="eda_concern_terms", kind="bar", title="Top Terms: Concerns About Apps",
+                       label="Term", color="purple", figsize=(7, 5), png_kind="barh"),
+            chart_top=15),
+    section("Consent", ["Consent", "I am 18+ and I consent to anonymous data collection for academic purposes only."],
+            summary="Consent responses: {counts}",
+            chart=dict(name="eda_consent", kind="bar", title="Consent Responses",
+                       label="Response", color="gray", figsize=(5, 4))),
+    section("Correlation", [], kind="corr",
+            chart=dict(name="eda_correlation", kind="heatmap", title="Correlation Heatmap (Numeric and Frequency Answers)",
+                       label="Correlation", figsize=(12, 10))),
+    section("Association", [], kind="assoc",
+            chart=dict(name="eda_association", kind="heatmap", title="Association of Categorical Answers (Cramér's V)",
+                       label="Cramér's V", figsize=(12, 10))),
+    trend_section("Daily_Responses", [RESPONSES], "day",
+                  chart=dict(name="eda_trend_daily_responses", kind="line", title="Responses per Day",
+                             label="Responses", color="skyblue", figsize=(7, 4))),
+    trend_section("Weekly_Stress", ["Stress Level"], "week",
+                  chart=dict(name="eda_trend_weekly_stress", kind="line", title="Stress Levels per Week",
+                             label="Respondents", figsize=(7, 4))),
+    trend_section("Weekly_Mood", ["Overall mood today"], "week",
+                  chart=dict(name="eda_trend_weekly_mood", kind="line", title="Mood per Week",
+                             label="Respondents", figsize=(7, 4))),
+    trend_section("Daily_Stress_Score", [STRESS_SCORE_COL], "day",
+                  chart=dict(name="eda_trend_daily_stress_score", kind="line", title="Mean Stress Score per Day",
+                             label="Mean score (0-24)", color="salmon", figsize=(7, 4))),
+    trend_section("Weekly_Agreement", [m for m in MEAN_METRICS if m != STRESS_SCORE_COL], "week",
+                  chart=dict(name="eda_trend_weekly_agreement", kind="line", title="Mean Agreement per Week",
+                             label="Mean (1-5)", figsize=(9, 5))),
+]
+
+
+# Artifact types a run can produce; the text summary is always written
+OUTPUTS = ("png", "html", "excel")
+
+
+def main(workers=1, embed_plotlyjs=False, outputs=OUTPUTS):
+    # A run whose data, code and settings all match the manifest is a no-op
+    build = BuildCache()
+    settings = {"embed_plotlyjs": embed_plotlyjs}
+    formats = [fmt for fmt in FORMATS if fmt in outputs]
+    code_key = file_key(__file__, eda_charts.__file__, eda_engine.__file__, eda_assoc.__file__,
+                        survey_text.__file__, survey_rollups.__file__)
+    run_key = content_key(file_key(cleaned_source(), OPTIONS_FILE, SCHEMA_FILE, ROLLUP_FILE), code_key, settings,
+                          sorted(outputs))
+    if build.fresh("run", run_key, track=False):
+        print("✅ EDA artifacts are up to date; nothing to rebuild.")
+        return
+
+    # Resolve every section's columns up front; only those (plus the numeric
+    # columns for the correlation heatmap) are read, in one chunked pass.
+    available = available_columns()
+    print("Available columns:", available)
+    with stage("plan"):
+        planned = plan_sections(SECTIONS, available, available_columns(numeric_only=True), read_options(),
+                                read_schema())
+    with stage("scan", sections=len(planned)):
+        results, rows = run_sections(planned)
+    print(f"Aggregated {len(results)} sections in one pass over {rows} responses")
+    with stage("trends"):
+        results += run_trends(SECTIONS, read_rollups())
 
-    print("Available columns:", df.columns.tolist())
     summary_text = []
+    sheets = []
+    charts = []
+    for spec, table in results:
+        if table.empty:
+            continue
+        sheets.append((spec["name"], table))
+        if spec["summary"]:
+            summary_text.append(spec["summary"].format(
+                top=table.idxmax(), top_count=table.max(), counts=table.to_dict()))
+        if spec["chart"]:
+            data = table.head(spec["chart_top"]) if spec["chart_top"] else table
+            charts.append(chart(data=data, **spec["chart"]))
 
-    with pd.ExcelWriter("EDA_Summary.xlsx", engine="openpyxl") as writer:
-
-        # ---------------------------
-        # Age Distribution
-        # ---------------------------
-        age_col = find_column(df, ["Age_Group", "Age", "Age (years)"])
-        if age_col:
-            age_counts = df[age_col].value_counts()
-            age_counts.to_excel(writer, sheet_name="Age_Distribution")
-            summary_text.append(f"Most common age group: {age_counts.idxmax()} ({age_counts.max()} respondents)")
-
-            plt.figure(figsize=(6, 4))
-            age_counts.plot(kind="bar", color="skyblue")
-            plt.title("Age Distribution")
-            plt.savefig("eda_age_distribution.png")
-            plt.close()
-
-            fig_age = px.bar(age_counts.reset_index(),
-                             x=age_counts.index,
-                             y=age_counts.values,
-                             labels={"x": "Age", "y": "Count"},
-                             title="Age Distribution")
-            fig_age.write_html("eda_age_distribution.html")
-
-        # ---------------------------
-        # Gender Distribution
-        # ---------------------------
-        gender_col = find_column(df, ["Gender", "gender"])
-        if gender_col:
-            gender_counts = df[gender_col].value_counts()
-            gender_counts.to_excel(writer, sheet_name="Gender_Distribution")
-            summary_text.append(f"Gender split: {gender_counts.to_dict()}")
-
-            plt.figure(figsize=(5, 4))
-            gender_counts.plot(kind="pie", autopct="%1.1f%%")
-            plt.title("Gender Distribution")
-            plt.ylabel("")
-            plt.savefig("eda_gender_distribution.png")
-            plt.close()
-
-            fig_gender = px.pie(df, names=gender_col, title="Gender Distribution")
-            fig_gender.write_html("eda_gender_distribution.html")
-
-        # ---------------------------
-        # Role Distribution
-        # ---------------------------
-        role_col = find_column(df, ["Role", "Primary role"])
-        if role_col:
-            role_counts = df[role_col].value_counts()
-            role_counts.to_excel(writer, sheet_name="Role_Distribution")
-            summary_text.append(f"Most common role: {role_counts.idxmax()} ({role_counts.max()} respondents)")
-
-            plt.figure(figsize=(7, 5))
-            role_counts.plot(kind="bar", color="orange")
-            plt.title("Role Distribution")
-            plt.savefig("eda_role_distribution.png")
-            plt.close()
-
-            fig_role = px.bar(role_counts.reset_index(),
-                              x=role_counts.index,
-                              y=role_counts.values,
-                              labels={"x": "Role", "y": "Count"},
-                              title="Role Distribution")
-            fig_role.write_html("eda_role_distribution.html")
-
-        # ---------------------------
-        # Country Distribution
-        # ---------------------------
-        country_col = find_column(df, ["Country", "Country/Region"])
-        if country_col:
-            country_counts = df[country_col].value_counts()
-            country_counts.to_excel(writer, sheet_name="Country_Distribution")
-
-            plt.figure(figsize=(8, 5))
-            country_counts.head(10).plot(kind="bar", color="teal")
-            plt.title("Top 10 Countries")
-            plt.savefig("eda_country_distribution.png")
-            plt.close()
-
-            fig_country = px.bar(country_counts.head(10).reset_index(),
-                                 x=country_counts.head(10).index,
-                                 y=country_counts.head(10).values,
-                                 labels={"x": "Country", "y": "Count"},
-                                 title="Top 10 Countries")
-            fig_country.write_html("eda_country_distribution.html")
-
-        # ---------------------------
-        # Stress Analysis
-        # ---------------------------
-        stress_col = find_column(df, ["Stress_Category", "Stress Level", "Stress"])
-        if stress_col:
-            stress_counts = df[stress_col].value_counts()
-            stress_counts.to_excel(writer, sheet_name="Stress_Distribution")
-            summary_text.append(f"Highest stress group: {stress_counts.idxmax()} ({stress_counts.max()} respondents)")
-
-            plt.figure(figsize=(5, 4))
-            stress_counts.plot(kind="bar", color="salmon")
-            plt.title("Stress Level Distribution")
-            plt.savefig("eda_stress_distribution.png")
-            plt.close()
-
-            fig_stress = px.bar(stress_counts.reset_index(),
-                                x=stress_counts.index,
-                                y=stress_counts.values,
-                                labels={"x": "Stress", "y": "Count"},
-                                title="Stress Level Distribution")
-            fig_stress.write_html("eda_stress_distribution.html")
-
-            if role_col:
-                stress_role = pd.crosstab(df[role_col], df[stress_col])
-                stress_role.to_excel(writer, sheet_name="Stress_By_Role")
-
-                stress_role.plot(kind="bar", figsize=(7, 5))
-                plt.title("Stress Levels by Role")
-                plt.savefig("eda_stress_by_role.png")
-                plt.close()
-
-                fig_stress_role = px.bar(stress_role, barmode="group", title="Stress Levels by Role")
-                fig_stress_role.write_html("eda_stress_by_role.html")
-
-        # ---------------------------
-        # AI Tool Usage
-        # ---------------------------
-        ai_col = find_column(df, ["Used_AI_Tool", "AI Tool Usage", "AI_Usage"])
-        if ai_col:
-            ai_counts = df[ai_col].value_counts()
-            ai_counts.to_excel(writer, sheet_name="AI_Tool_Usage")
-            summary_text.append(f"AI tool usage: {ai_counts.to_dict()}")
-
-            plt.figure(figsize=(5, 4))
-            ai_counts.plot(kind="pie", autopct="%1.1f%%")
-            plt.title("AI Tool Usage (Yes/No)")
-            plt.ylabel("")
-            plt.savefig("eda_ai_tool_usage.png")
-            plt.close()
-
-            fig_ai = px.pie(df, names=ai_col, title="AI Tool Usage (Yes/No)")
-            fig_ai.write_html("eda_ai_tool_usage.html")
-
-        # ---------------------------
-        # App Usage
-        # ---------------------------
-        apps_col = find_column(df, ["Wellness_Apps", "Which wellness/mental health apps have you used in the last 6 months? (select all that apply)"])
-        if apps_col:
-            apps_exploded = df[apps_col].astype(str).str.split(",").explode()
-            app_counts = apps_exploded.value_counts()
-            app_counts.to_excel(writer, sheet_name="App_Usage")
-            summary_text.append(f"Most popular app: {app_counts.idxmax()} ({app_counts.max()} users)")
-
-            plt.figure(figsize=(7, 5))
-            app_counts.plot(kind="bar", color="blue")
-            plt.title("Wellness App Usage")
-            plt.savefig("eda_app_usage.png")
-            plt.close()
-
-            fig_apps = px.bar(app_counts.reset_index(),
-                              x=app_counts.index,
-                              y=app_counts.values,
-                              labels={"x": "App", "y": "Count"},
-                              title="Wellness App Usage")
-            fig_apps.write_html("eda_app_usage.html")
-
-        # ---------------------------
-        # Concerns
-        # ---------------------------
-        concerns_col = find_column(df, ["Concerns_List", "Concerns", "Mental Health Concerns"])
-        if concerns_col:
-            concerns_exploded = df[concerns_col].astype(str).str.split(",").explode()
-            top_concerns = concerns_exploded.value_counts()
-            top_concerns.to_excel(writer, sheet_name="Concerns")
-            summary_text.append(f"Top concern: {top_concerns.idxmax()} ({top_concerns.max()} respondents)")
-
-            plt.figure(figsize=(7, 5))
-            top_concerns.plot(kind="bar", color="purple")
-            plt.title("Top Reported Mental Health Concerns")
-            plt.savefig("eda_concerns.png")
-            plt.close()
-
-            fig_concerns = px.bar(top_concerns.reset_index(),
-                                  x=top_concerns.index,
-                                  y=top_concerns.values,
-                                  labels={"x": "Concern", "y": "Count"},
-                                  title="Top Reported Mental Health Concerns")
-            fig_concerns.write_html("eda_concerns.html")
-
-        # ---------------------------
-        # Desired Features
-        # ---------------------------
-        features_col = find_column(df, ["Desired_Features", "Features", "Wanted Features"])
-        if features_col:
-            features_exploded = df[features_col].astype(str).str.split(",").explode()
-            top_features = features_exploded.value_counts()
-            top_features.to_excel(writer, sheet_name="Desired_Features")
-            summary_text.append(f"Most wanted feature: {top_features.idxmax()} ({top_features.max()} requests)")
-
-            plt.figure(figsize=(7, 5))
-            top_features.plot(kind="barh", color="green")
-            plt.title("Most Wanted Features")
-            plt.savefig("eda_features.png")
-            plt.close()
-
-            fig_features = px.bar(top_features.reset_index(),
-                                  x=top_features.index,
-                                  y=top_features.values,
-                                  labels={"x": "Feature", "y": "Count"},
-                                  title="Most Wanted Features")
-            fig_features.write_html("eda_features.html")
-
-        # ---------------------------
-        # Privacy & Preferences
-        # ---------------------------
-        privacy_col = find_column(df, ["Consent", "I am 18+ and I consent to anonymous data collection for academic purposes only."])
-        if privacy_col:
-            privacy_counts = df[privacy_col].value_counts()
-            privacy_counts.to_excel(writer, sheet_name="Consent")
-            summary_text.append(f"Consent responses: {privacy_counts.to_dict()}")
-
-            plt.figure(figsize=(5, 4))
-            privacy_counts.plot(kind="bar", color="gray")
-            plt.title("Consent Responses")
-            plt.savefig("eda_consent.png")
-            plt.close()
-
-            fig_privacy = px.bar(privacy_counts.reset_index(),
-                                 x=privacy_counts.index,
-                                 y=privacy_counts.values,
-                                 labels={"x": "Response", "y": "Count"},
-                                 title="Consent Responses")
-            fig_privacy.write_html("eda_consent.html")
-
-        # ---------------------------
-        # Correlation Heatmap
-        # ---------------------------
-        numeric_cols = df.select_dtypes(include=["int64", "float64"])
-        if not numeric_cols.empty:
-            corr = numeric_cols.corr()
-            corr.to_excel(writer, sheet_name="Correlation")
-
-            plt.figure(figsize=(6, 5))
-            sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
-            plt.title("Correlation Heatmap (Numeric Features)")
-            plt.savefig("eda_correlation.png")
-            plt.close()
-
-            fig_corr = px.imshow(corr.values,
-                                 labels=dict(x="Features", y="Features", color="Correlation"),
-                                 x=corr.columns.tolist(),
-                                 y=corr.index.tolist(),
-                                 text_auto=True,
-                                 color_continuous_scale="RdBu_r",
-                                 title="Correlation Heatmap (Numeric Features)")
-            fig_corr.write_html("eda_correlation.html")
+    # ---------------------------
+    # Build: only artifacts whose inputs changed
+    # ---------------------------
+    # Each chart file is keyed on its table, its rendering settings and the
+    # renderer's code; the PNG/HTML rendering is what a process pool speeds
+    # up. HTML files share one plotly.min.js unless embed_plotlyjs.
+    stale = []
+    for spec in charts:
+        key = content_key(spec["data"], {k: v for k, v in spec.items() if k != "data"}, settings, code_key)
+        missing = [fmt for fmt in formats if not build.fresh(f"{spec['name']}.{fmt}", key)]
+        if missing:
+            stale.append((spec, key, missing))
+    with stage("render_charts", charts=len(stale), workers=workers):
+        render_charts([spec for spec, _, _ in stale], workers=workers, embed_plotlyjs=embed_plotlyjs,
+                      formats=[missing for _, _, missing in stale])
+    for spec, key, missing in stale:
+        for fmt in missing:
+            shared = [PLOTLY_JS] if fmt == "html" and not embed_plotlyjs else []
+            build.record(f"{spec['name']}.{fmt}", key, [f"{spec['name']}.{fmt}"] + shared)
+
+    workbook_key = content_key(*[part for sheet in sheets for part in sheet])
+    if "excel" in outputs and not build.fresh("EDA_Summary.xlsx", workbook_key):
+        with stage("workbook"), pd.ExcelWriter("EDA_Summary.xlsx", engine="openpyxl") as writer:
+            for sheet_name, table in sheets:
+                table.to_excel(writer, sheet_name=sheet_name)
+        build.record("EDA_Summary.xlsx", workbook_key, ["EDA_Summary.xlsx"])
 
     # ---------------------------
     # Save Text Summary
     # ---------------------------
-    with open("EDA_Text_Summary.txt", "w") as f:
-        for line in summary_text:
-            f.write(line + "\n")
+    if not build.fresh("EDA_Text_Summary.txt", content_key(summary_text)):
+        with open("EDA_Text_Summary.txt", "w") as f:
+            for line in summary_text:
+                f.write(line + "\n")
+        build.record("EDA_Text_Summary.txt", content_key(summary_text), ["EDA_Text_Summary.txt"])
+
+    build.record("run", run_key, sorted({out for name, entry in build.entries.items()
+                                         if name != "run" for out in entry["outputs"]}))
+    build.save()
+    print(build.report())
 
     print("\n✅ EDA complete.")
-    print("📊 Static charts saved as PNG")
-    print("🖱️ Interactive charts saved as HTML")
-    print("📑 Summary tables saved to EDA_Summary.xlsx")
+    if "png" in outputs:
+        print("📊 Static charts saved as PNG")
+    if "html" in outputs:
+        print("🖱️ Interactive charts saved as HTML")
+    if "excel" in outputs:
+        print("📑 Summary tables saved to EDA_Summary.xlsx")
     print("📝 Insights saved to EDA_Text_Summary.txt")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="EDA report for the cleaned wellbeing survey.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes rendering charts in parallel (0 = one per CPU)")
+    parser.add_argument("--only", nargs="+", choices=OUTPUTS, default=OUTPUTS, metavar="OUTPUT",
+                        help="produce only these outputs: png, html and/or excel (default: all; "
+                             "the libraries of the others are not even imported)")
+    parser.add_argument("--embed-plotlyjs", action="store_true",
+                        help="embed plotly.js in every HTML file instead of sharing plotly.min.js")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, default=None,
+                        help="append per-stage timings as JSON lines to this file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record tracemalloc peaks per stage (slower)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.trace:
+        configure_trace(args.trace, memory=args.trace_memory)
+    main(workers=args.workers or os.cpu_count(), embed_plotlyjs=args.embed_plotlyjs, outputs=args.only)
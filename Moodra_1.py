@@ -4,12 +4,44 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from io import BytesIO
+
+from survey_data import cache_stats
+from survey_engine import BASE_FILTERS, open_engine
+from survey_export import selection_signature
+from survey_metrics import SCORE_MAX, STRESS_LEVEL_COL, STRESS_SCORE_COL
+from survey_rollups import RESPONSES
+from survey_figures import cached_figure, figure_stats
+from survey_service import RemoteEngine, service_url
+from survey_text import SEARCH_KEY
+from survey_trace import annotate, enabled as tracing, stage, start_collecting, stop_collecting
+
+# Per-stage timings of this rerun, shown at the bottom of the page when
+# "Show timing breakdown" is ticked in the sidebar
+if st.session_state.get("debug_timings"):
+    start_collecting()
+else:
+    stop_collecting()
 
 # -------------------------
 # Load Data
 # -------------------------
-df = pd.read_csv("wellbeing_survey_res_Cleaned.csv")
+# Filters and counts are answered by a query engine: a bitmap index over the
+# sidebar filters plus a count cube over them and every charted column. By
+# default it lives in this process, built once per data version from only the
+# columns the page draws (Parquet when the cleaner produced it, compact
+# dtypes), or unpickled from the snapshot `python survey_engine.py` writes
+# while that still matches the data; SURVEY_BACKEND=sqlite instead runs them
+# as SQL against the cleaner's SQLite copy, for data larger than memory. With
+# SURVEY_SERVICE_URL set, every replica instead asks one running
+# survey_service.py, which keeps the only warm copy and batches each rerun's
+# queries into a single request.
+with stage("engine"):
+    engine = RemoteEngine(service_url()) if service_url() else open_engine()
+
+stress_col = engine.layout["stress_col"]
+apps_col = engine.layout["apps_col"]
+FILTER_COLUMNS = engine.filter_columns
+CHART_COLUMNS = engine.chart_columns
 
 # -------------------------
 # App Branding
@@ -17,6 +49,12 @@ df = pd.read_csv("wellbeing_survey_res_Cleaned.csv")
 st.set_page_config(page_title="Moodra Dashboard", layout="wide")
 st.title(" Moodra - Your mood, your mantra — tracked, protected, and supported.")
 st.markdown("Gain insights from survey data on stress, AI usage, and mental health trends.")
+# Cleaned data written by an older cleaner lacks the derived stress columns,
+# and with them the stress filter, slider and charts
+missing_derived = [col for col in (STRESS_SCORE_COL, STRESS_LEVEL_COL) if col not in engine.columns]
+if missing_derived:
+    st.warning(f"The cleaned data has no {' / '.join(missing_derived)} column, so the stress views are "
+               "hidden. Run `python wellbeing_survey_res_Cleaning.py` to regenerate it.")
 
 # -------------------------
 # Filters
@@ -28,65 +66,179 @@ with st.sidebar:
 
     age_filter = st.multiselect(
         "Age Group",
-        options=df["Age (years)"].dropna().unique(),
-        default=df["Age (years)"].dropna().unique()
+        options=engine.values("Age (years)"),
+        default=engine.values("Age (years)")
     )
 
     gender_filter = st.multiselect(
         "Gender",
-        options=df["Gender (optional)"].dropna().unique(),
-        default=df["Gender (optional)"].dropna().unique()
+        options=engine.values("Gender (optional)"),
+        default=engine.values("Gender (optional)")
     )
 
     role_filter = st.multiselect(
         "Role",
-        options=df["Primary role"].dropna().unique(),
-        default=df["Primary role"].dropna().unique()
+        options=engine.values("Primary role"),
+        default=engine.values("Primary role")
     )
 
-    # Stress column detection
-    stress_col = next((col for col in df.columns if "stress" in col.lower()), None)
     stress_filter = st.multiselect(
         "Stress Level",
-        options=df[stress_col].dropna().unique() if stress_col else [],
-        default=df[stress_col].dropna().unique() if stress_col else []
+        options=engine.values(stress_col),
+        default=engine.values(stress_col)
     ) if stress_col else None
 
-    # Wellness Apps multi-select filter (if present)
-    apps_col = next((col for col in df.columns if "wellness apps" in col.lower()), None)
+    # Composite stress score; a range is answered by binary search over the sorted scores
+    score_col = STRESS_SCORE_COL if STRESS_SCORE_COL in engine.layout.get("range_columns", []) else None
+    score_bounds = engine.values(score_col) if score_col else []
+    score_range = st.slider(
+        "Stress Score",
+        min_value=score_bounds[0],
+        max_value=score_bounds[1],
+        value=(score_bounds[0], score_bounds[1]),
+        help=f"Sum of the four perceived-stress items, reverse-scored where marked (0-{SCORE_MAX})",
+    ) if len(score_bounds) == 2 and score_bounds[0] < score_bounds[1] else None
+
+    # Response dates; a range is answered by binary search over the time-sorted timestamps
+    time_col = engine.layout.get("time_col")
+    time_bounds = engine.values(time_col) if time_col else []
+    first_day, last_day = (pd.Timestamp(day).date() for day in time_bounds) if len(time_bounds) == 2 else (None, None)
+    date_range = st.date_input(
+        "Response Dates",
+        value=(first_day, last_day),
+        min_value=first_day,
+        max_value=last_day,
+    ) if first_day else None
+    trend_period = st.radio("Trend Granularity", ["day", "week"], format_func=str.title,
+                            horizontal=True) if first_day else None
+
+    # Wellness Apps multi-select filter (if present): matches respondents who
+    # used any of the selected apps
     apps_filter = st.multiselect(
         "Wellness Apps",
-        options=df[apps_col].dropna().unique() if apps_col else [],
-        default=df[apps_col].dropna().unique() if apps_col else []
+        options=engine.values(apps_col),
+        default=engine.values(apps_col)
     ) if apps_col else None
 
+    # Keyword search over the open-text answers, answered from their term index
+    search = st.text_input(
+        "Search open-text answers",
+        placeholder='e.g. privacy, "human connection"',
+        help="Matches respondents whose wishes or concerns contain every word; "
+             "quote words to match them as a phrase.",
+    ) if engine.layout.get("text_columns") else ""
+
+    st.markdown("---")
+    stats = cache_stats()
+    st.caption(f"Data cache: {stats['hits']} hits / {stats['misses']} misses ({stats['reloads']} reloads)")
+    figures = figure_stats()
+    st.caption(f"Figure cache: {figures['hits']} hits / {figures['misses']} misses "
+               f"({figures['entries']} figures, {figures['bytes'] / 1024:.0f} KB)")
+    st.checkbox("Show timing breakdown", key="debug_timings")
+
 # -------------------------
 # Apply Filters
 # -------------------------
-df_filtered = df[
-    df["Age (years)"].isin(age_filter) &
-    df["Gender (optional)"].isin(gender_filter) &
-    df["Primary role"].isin(role_filter)
-]
+selection = {
+    "Age (years)": age_filter,
+    "Gender (optional)": gender_filter,
+    "Primary role": role_filter,
+}
 
 if stress_filter and stress_col:
-    df_filtered = df_filtered[df_filtered[stress_col].isin(stress_filter)]
+    selection[stress_col] = stress_filter
+
+# Selecting every app is no restriction; only a narrower choice filters rows
+apps_narrowed = bool(apps_filter) and set(apps_filter) != set(engine.values(apps_col))
+if apps_narrowed:
+    selection[apps_col] = apps_filter
+
+# Like apps, the score range only filters once narrowed, so respondents
+# without a score stay in by default
+if score_range and list(score_range) != score_bounds:
+    selection[score_col] = list(score_range)
+
+# A half-picked range (one day clicked so far) keeps the previous rerun's filter off
+time_range = time_bounds
+if date_range and len(date_range) == 2:
+    time_range = [day.isoformat() for day in date_range]
+    if time_range != time_bounds:
+        selection[time_col] = time_range
+
+if search.strip():
+    selection[SEARCH_KEY] = [search.strip()]
+
+# Trend lines come from the cleaner's daily/weekly rollups
+TREND_METRICS = [RESPONSES, STRESS_LEVEL_COL, STRESS_SCORE_COL]
+
+# Every count this page shows, asked for up front: a remote engine answers
+# them all in one round trip, the in-process one needs no warming
+with stage("select"):
+    charted = [col for col in BASE_FILTERS + CHART_COLUMNS + [stress_col] if col in engine.columns]
+    queries = [{"op": "total", "selection": selection}]
+    queries += [{"op": "counts", "dim": col, "selection": selection} for col in charted]
+    if stress_col:
+        queries += [{"op": "crosstab", "dim": stress_col, "by": by, "selection": selection}
+                    for by in BASE_FILTERS if by in engine.columns]
+    if trend_period:
+        queries += [{"op": "trend", "metric": metric, "period": trend_period, "dates": time_range}
+                    for metric in TREND_METRICS]
+    engine.prefetch(queries)
+
+# -------------------------
+# Chart Figures
+# -------------------------
+# Every chart is drawn from cube counts, so the figure sent to the browser
+# holds one point per category rather than one per respondent.
+#
+# Each chart counts over the whole selection, so its figure depends on the
+# data version and on the filters that actually narrow it (a filter left on
+# all of its values is the same as none). Figures are kept in a shared LRU
+# cache under that key: reruns that change neither (the timing checkbox,
+# another session with the same filters, going back to an earlier choice)
+# redraw without rebuilding, and a filter change only rebuilds what it
+# narrows.
+data_version = engine.version
+narrowing = {col: values for col, values in selection.items()
+             if col == SEARCH_KEY or set(values) != set(engine.values(col))}
+figure_filters = selection_signature(narrowing)
+
+
+def plot(name, build, filters=None):
+    """Draw chart name, building its figure only on a cache miss
+
+    filters: signature of what the figure depends on when that is not the
+    whole selection
+    """
+    fig = cached_figure((data_version, name, filters or figure_filters), build)
+    if tracing():
+        annotate(payload_bytes=len(fig.to_json()))
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def count_bars(dim, label, title, **kwargs):
+    counts = engine.counts(dim, selection).reset_index()
+    counts.columns = [label, "Count"]
+    return px.bar(counts, x=label, y="Count", title=title, **kwargs)
+
+
+def count_pie(dim, title):
+    counts = engine.counts(dim, selection)
+    return px.pie(names=counts.index, values=counts.values, title=title)
 
-if apps_filter and apps_col:
-    df_filtered = df_filtered[df_filtered[apps_col].isin(apps_filter)]
 
 # -------------------------
 # KPI Summary Cards
 # -------------------------
 st.subheader("📊 Summary Insights")
 col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric("Total Responses", len(df_filtered))
-with col2:
-    st.metric("Unique Roles", df_filtered["Primary role"].nunique())
-with col3:
-    if "Overall mood today" in df.columns:
-        mood_counts = df_filtered["Overall mood today"].value_counts()
+with col1, stage("kpi/responses"):
+    st.metric("Total Responses", engine.total(selection))
+with col2, stage("kpi/roles"):
+    st.metric("Unique Roles", len(engine.counts("Primary role", selection)))
+with col3, stage("kpi/mood"):
+    if "Overall mood today" in engine.columns:
+        mood_counts = engine.counts("Overall mood today", selection)
         st.metric("Most Common Mood", f"{mood_counts.idxmax() if len(mood_counts) > 0 else 'N/A'}")
 
 st.markdown("---")
@@ -95,32 +247,22 @@ st.markdown("---")
 # Distribution Charts
 # -------------------------
 col1, col2 = st.columns(2)
-with col1:
-    if "Age (years)" in df.columns:
-        age_counts = df_filtered["Age (years)"].value_counts().reset_index()
-        age_counts.columns = ["Age", "Count"]
-        fig_age = px.bar(age_counts, x="Age", y="Count", title="Age Distribution")
-        st.plotly_chart(fig_age, use_container_width=True)
-
-with col2:
-    if "Gender (optional)" in df.columns:
-        fig_gender = px.pie(df_filtered, names="Gender (optional)", title="Gender Distribution")
-        st.plotly_chart(fig_gender, use_container_width=True)
+with col1, stage("chart/age"):
+    if "Age (years)" in engine.columns:
+        plot("age", lambda: count_bars("Age (years)", "Age", "Age Distribution"))
+
+with col2, stage("chart/gender"):
+    if "Gender (optional)" in engine.columns:
+        plot("gender", lambda: count_pie("Gender (optional)", "Gender Distribution"))
 
 col3, col4 = st.columns(2)
-with col3:
-    if "Primary role" in df.columns:
-        role_counts = df_filtered["Primary role"].value_counts().reset_index()
-        role_counts.columns = ["Role", "Count"]
-        fig_role = px.bar(role_counts, x="Role", y="Count", title="Role Distribution")
-        st.plotly_chart(fig_role, use_container_width=True)
+with col3, stage("chart/role"):
+    if "Primary role" in engine.columns:
+        plot("role", lambda: count_bars("Primary role", "Role", "Role Distribution"))
 
-with col4:
-    if "Overall mood today" in df.columns:
-        mood_counts = df_filtered["Overall mood today"].value_counts().reset_index()
-        mood_counts.columns = ["Mood", "Count"]
-        fig_mood = px.bar(mood_counts, x="Mood", y="Count", title="Mood Distribution")
-        st.plotly_chart(fig_mood, use_container_width=True)
+with col4, stage("chart/mood"):
+    if "Overall mood today" in engine.columns:
+        plot("mood", lambda: count_bars("Overall mood today", "Mood", "Mood Distribution"))
 
 # -------------------------
 # Stress Level Analysis
@@ -128,62 +270,117 @@ with col4:
 if stress_col:
     st.subheader("🧠 Stress Level Analysis")
 
-    
-    stress_colors = {level: px.colors.qualitative.Plotly[i % 10] for i, level in enumerate(df_filtered[stress_col].dropna().unique())}
+    def stress_distribution():
+        levels = engine.counts(stress_col, selection).index
+        stress_colors = {level: px.colors.qualitative.Plotly[i % 10] for i, level in enumerate(levels)}
+        return count_bars(stress_col, "Stress Level", "Stress Level Distribution",
+                          color="Stress Level", color_discrete_map=stress_colors)
 
     # Basic distribution
-    stress_counts = df_filtered[stress_col].value_counts().reset_index()
-    stress_counts.columns = ["Stress Level", "Count"]
-    fig_stress = px.bar(stress_counts, x="Stress Level", y="Count", title="Stress Level Distribution", color="Stress Level", color_discrete_map=stress_colors)
-    st.plotly_chart(fig_stress, use_container_width=True)
+    with stage("chart/stress"):
+        plot("stress", stress_distribution)
+
+    def stress_bars(by, title):
+        """Grouped bars of respondents per (stress level, by) pair, from the cube"""
+        pairs = engine.crosstab(stress_col, by, selection).astype({by: str})
+        return px.bar(pairs, x=stress_col, y="count", color=by, barmode="group", title=title)
 
     # Gender
-    if "Gender (optional)" in df.columns:
-        fig_stress_gender = px.histogram(df_filtered, x=stress_col, color="Gender (optional)", barmode="group", title="Stress Level by Gender")
-        st.plotly_chart(fig_stress_gender, use_container_width=True)
+    if "Gender (optional)" in engine.columns:
+        with stage("chart/stress_gender"):
+            plot("stress_gender", lambda: stress_bars("Gender (optional)", "Stress Level by Gender"))
 
     # Role
-    if "Primary role" in df.columns:
-        fig_stress_role = px.histogram(df_filtered, x=stress_col, color="Primary role", barmode="group", title="Stress Level by Role")
-        st.plotly_chart(fig_stress_role, use_container_width=True)
+    if "Primary role" in engine.columns:
+        with stage("chart/stress_role"):
+            plot("stress_role", lambda: stress_bars("Primary role", "Stress Level by Role"))
 
     # Age
-    if "Age (years)" in df.columns:
-        fig_stress_age = px.histogram(df_filtered, x=stress_col, color="Age (years)", barmode="group", title="Stress Level by Age Group")
-        st.plotly_chart(fig_stress_age, use_container_width=True)
+    if "Age (years)" in engine.columns:
+        with stage("chart/stress_age"):
+            plot("stress_age", lambda: stress_bars("Age (years)", "Stress Level by Age Group"))
+
+
+# -------------------------
+# Trends
+# -------------------------
+# Read from the rollups the cleaner keeps per day and week: a few rows per
+# bucket instead of a rescan of every response. Rollups are over everyone,
+# so only the date range applies to them.
+if trend_period and engine.trend(RESPONSES, trend_period, *time_range) is not None:
+    st.subheader("📈 Trends")
+    st.caption("All respondents in the selected dates; the other filters don't apply to trends.")
+    trend_filters = selection_signature({"period": [trend_period], "dates": time_range})
+
+    def trend_lines(metric, title, label):
+        table = engine.trend(metric, trend_period, *time_range)
+        per_key = bool(table["key"].ne("").any())
+        return px.line(table, x="start", y="value", color="key" if per_key else None, markers=True,
+                       title=title, labels={"start": trend_period.title(), "value": label, "key": ""})
+
+    col7, col8 = st.columns(2)
+    with col7, stage("chart/trend_responses"):
+        plot("trend_responses", lambda: trend_lines(RESPONSES, "Responses", "Responses"), trend_filters)
+    with col8, stage("chart/trend_stress"):
+        plot("trend_stress", lambda: trend_lines(STRESS_SCORE_COL, "Mean Stress Score", "Mean score"),
+             trend_filters)
+    with stage("chart/trend_levels"):
+        plot("trend_levels", lambda: trend_lines(STRESS_LEVEL_COL, "Stress Levels", "Respondents"),
+             trend_filters)
+elif trend_period:
+    st.info("Trends need the cleaner's daily/weekly rollups, which are not built yet. "
+            "Run `python wellbeing_survey_res_Cleaning.py` to build them.")
 
 
 # Journaling & Sleep
 
 col5, col6 = st.columns(2)
-with col5:
-    if "How often do you journal?" in df.columns:
-        fig_journal = px.pie(df_filtered, names="How often do you journal?", title="Journaling Frequency")
-        st.plotly_chart(fig_journal, use_container_width=True)
-
-with col6:
-    if "Average sleep hours per night (past 2 weeks)" in df.columns:
-        sleep_counts = df_filtered["Average sleep hours per night (past 2 weeks)"].value_counts().reset_index()
-        sleep_counts.columns = ["Sleep Duration", "Count"]
-        fig_sleep = px.bar(sleep_counts, x="Sleep Duration", y="Count", title="Sleep Duration Distribution")
-        st.plotly_chart(fig_sleep, use_container_width=True)
+with col5, stage("chart/journal"):
+    if "How often do you journal?" in engine.columns:
+        plot("journal", lambda: count_pie("How often do you journal?", "Journaling Frequency"))
+
+with col6, stage("chart/sleep"):
+    if "Average sleep hours per night (past 2 weeks)" in engine.columns:
+        plot("sleep", lambda: count_bars("Average sleep hours per night (past 2 weeks)", "Sleep Duration",
+                                         "Sleep Duration Distribution"))
 
 # Privacy Concerns
-if "I am concerned about privacy of my journals." in df.columns:
-    privacy_counts = df_filtered["I am concerned about privacy of my journals."].value_counts().reset_index()
-    privacy_counts.columns = ["Response", "Count"]
-    fig_privacy = px.bar(privacy_counts, x="Response", y="Count", title="Privacy Concerns")
-    st.plotly_chart(fig_privacy, use_container_width=True)
+if "I am concerned about privacy of my journals." in engine.columns:
+    with stage("chart/privacy"):
+        plot("privacy", lambda: count_bars("I am concerned about privacy of my journals.", "Response",
+                                           "Privacy Concerns"))
 
 # Download
 st.markdown("---")
 st.subheader("⬇️ Download Insights")
-csv_data = df_filtered.to_csv(index=False).encode("utf-8")
-st.download_button("Download Filtered Data (CSV)", data=csv_data, file_name="moodra_filtered_data.csv", mime="text/csv")
+# Files are only built when asked for, then cached per (data version, filters)
+# and shared across sessions (by the service, when there is one). Exports
+# carry every column, so they stream the matching rows in chunks (from the
+# cleaned Parquet/CSV, or chunked SQL on the SQLite backend) and never load
+# the full dataset. The section is a fragment: its buttons rerun only this
+# block, not the charts above.
+export_key = (data_version, selection_signature(selection))
 
-excel_buffer = BytesIO()
-df_filtered.to_excel(excel_buffer, index=False, engine="openpyxl")
-st.download_button("Download Filtered Data (Excel)", data=excel_buffer, file_name="moodra_filtered_data.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+@st.fragment
+def downloads():
+    col_csv, col_excel = st.columns(2)
+    with col_csv, stage("export/csv"):
+        if st.button("Prepare CSV export"):
+            st.session_state["export_csv"] = export_key
+        if st.session_state.get("export_csv") == export_key:
+            csv_data = engine.export("csv", selection)
+            st.download_button("Download Filtered Data (CSV)", data=csv_data, file_name="moodra_filtered_data.csv", mime="text/csv")
+
+    with col_excel, stage("export/xlsx"):
+        if st.button("Prepare Excel export"):
+            st.session_state["export_xlsx"] = export_key
+        if st.session_state.get("export_xlsx") == export_key:
+            excel_data = engine.export("xlsx", selection)
+            st.download_button("Download Filtered Data (Excel)", data=excel_data, file_name="moodra_filtered_data.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+downloads()
 
 
 # footer
@@ -217,4 +414,19 @@ st.markdown( """
     unsafe_allow_html=True
 )
 
-
+# -------------------------
+# Debug: Timing Breakdown
+# -------------------------
+if st.session_state.get("debug_timings"):
+    timings = pd.DataFrame(stop_collecting())
+    with st.expander("⏱️ Timing breakdown of this rerun", expanded=True):
+        if timings.empty:
+            st.caption("Timings start with the next rerun.")
+        else:
+            timings["ms"] = (timings.pop("seconds") * 1000).round(1)
+            payload = timings["payload_bytes"].sum() if "payload_bytes" in timings else 0
+            memory = (f" · RSS {timings['rss_mb'].iloc[-1]:.0f} MB (peak {timings['max_rss_mb'].max():.0f} MB)"
+                      if "max_rss_mb" in timings else "")
+            st.caption(f"{timings['ms'].sum():.0f} ms in {len(timings)} stages · "
+                       f"{payload / 1024:.1f} KB of chart JSON" + memory)
+            st.dataframe(timings, hide_index=True, use_container_width=True)
@@ -0,0 +1,199 @@
+# bench_survey.py
+# Benchmarks of the cleaning, EDA and dashboard paths on synthetic surveys
+#
+#   python bench_survey.py --rows 1000 100000 1000000
+#   python bench_survey.py --rows 100000 --compare <older commit>
+#
+# Every stage runs in a fresh interpreter inside a scratch directory, so its
+# peak RSS is its own and no cache survives from the stage before. Results
+# are appended to bench_results.jsonl, one JSON record per measured step,
+# tagged with the commit they were measured on.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = "bench_results.jsonl"
+RAW_FILE = "wellbeing_survey_res.csv"
+CHUNK_ROWS = 100_000
+
+
+def _timed(steps, name, fn):
+    start = time.perf_counter()
+    value = fn()
+    steps.append({"step": name, "seconds": round(time.perf_counter() - start, 4)})
+    return value
+
+
+# ---------------------------
+# Stages (each runs in its own process, cwd = scratch directory)
+# ---------------------------
+def stage_clean(steps):
+    import wellbeing_survey_res_Cleaning as cleaning
+    _timed(steps, "main", lambda: cleaning.main(RAW_FILE))
+
+
+def stage_clean_chunked(steps):
+    import wellbeing_survey_res_Cleaning as cleaning
+    _timed(steps, "main", lambda: cleaning.main(RAW_FILE, chunksize=CHUNK_ROWS))
+
+
+def stage_eda(steps):
+    import EDA
+    from eda_cache import MANIFEST_FILE
+    if os.path.exists(MANIFEST_FILE):
+        os.remove(MANIFEST_FILE)
+    _timed(steps, "cold", EDA.main)
+    _timed(steps, "unchanged", EDA.main)
+
+
+def stage_dashboard(steps):
+    """Moodra_1.py through Streamlit's test runner: first render, a plain
+    rerun, then narrowing the Gender and Wellness Apps filters"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "Moodra_1.py"), default_timeout=600)
+    _timed(steps, "first_render", app.run)
+    _timed(steps, "rerun", app.run)
+    gender = next(w for w in app.multiselect if w.label == "Gender")
+    gender.set_value(gender.value[:1])
+    _timed(steps, "filter", app.run)
+    apps = next((w for w in app.multiselect if w.label == "Wellness Apps"), None)
+    if apps is not None:
+        apps.set_value(apps.value[:2])
+        _timed(steps, "filter_apps", app.run)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+
+STAGES = {
+    "clean_chunked": stage_clean_chunked,
+    "clean": stage_clean,
+    "eda": stage_eda,
+    "dashboard": stage_dashboard,
+}
+
+
+def run_stage(name, trace=False):
+    """Child-process entry point: run one stage and print its measurements as JSON"""
+    sys.path.insert(0, REPO_DIR)
+    from survey_trace import max_rss_mb
+    if trace:
+        tracemalloc.start()
+    steps = []
+    STAGES[name](steps)
+    record = {"steps": steps}
+    peak = max_rss_mb()
+    if peak is not None:
+        record["peak_rss_mb"] = round(peak, 1)
+    if trace:
+        record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    print(json.dumps(record))
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(rows, stages, seed, trace, workdir):
+    """Generate rows synthetic responses in workdir and measure every stage on them"""
+    from survey_synth import write_survey
+
+    records = []
+    start = time.perf_counter()
+    write_survey(os.path.join(workdir, RAW_FILE), rows, seed)
+    records.append({"stage": "generate", "step": "write_survey",
+                    "seconds": round(time.perf_counter() - start, 4)})
+    for name in stages:
+        cmd = [sys.executable, os.path.abspath(__file__), "--run-stage", name]
+        if trace:
+            cmd.append("--tracemalloc")
+        proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            raise SystemExit(f"❌ Stage {name} failed at {rows} rows")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        for step in result.pop("steps"):
+            records.append({"stage": name, **step, **result})
+    return records
+
+
+def compare(records, baseline, path=RESULTS_FILE):
+    """Print each step's time against the latest result for the baseline commit"""
+    base = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("commit") and rec["commit"].startswith(baseline):
+                base[(rec["rows"], rec["stage"], rec["step"])] = rec
+    print(f"\nvs {baseline}:")
+    for rec in records:
+        old = base.get((rec["rows"], rec["stage"], rec["step"]))
+        if old and old["seconds"]:
+            print(f"  {rec['rows']:>10} {rec['stage'] + '/' + rec['step']:<28}"
+                  f" {old['seconds']:>9.3f}s -> {rec['seconds']:>9.3f}s"
+                  f"  x{rec['seconds'] / old['seconds']:.2f}")
+
+
+def main(rows_list, stages, seed=0, trace=False, output=RESULTS_FILE, keep=False, baseline=None):
+    commit = git_commit()
+    when = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    records = []
+    for rows in rows_list:
+        workdir = tempfile.mkdtemp(prefix=f"bench_{rows}_")
+        try:
+            for rec in bench_size(rows, stages, seed, trace, workdir):
+                rec = {"commit": commit, "time": when, "rows": rows, "seed": seed, **rec}
+                records.append(rec)
+                mem = f"{rec['peak_rss_mb']:>9.1f} MB" if "peak_rss_mb" in rec else ""
+                print(f"{rows:>10} {rec['stage'] + '/' + rec['step']:<28} {rec['seconds']:>9.3f}s {mem}")
+        finally:
+            if keep:
+                print("Scratch directory kept:", workdir)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+    print(f"✅ {len(records)} results appended to {output}")
+    if baseline:
+        compare(records, baseline, output)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cleaning, EDA and the dashboard on synthetic surveys.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Also report peak Python allocations (slows every stage down)")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--compare", dest="baseline", default=None,
+                        help="Commit whose earlier results in --output to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories")
+    parser.add_argument("--run-stage", choices=list(STAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_stage:
+        run_stage(args.run_stage, args.tracemalloc)
+    else:
+        main(args.rows, args.stages, args.seed, args.tracemalloc, args.output, args.keep, args.baseline)
@@ -0,0 +1,138 @@
+# eda_assoc.py
+# Mergeable streaming association statistics behind EDA's correlation sections
+#
+# Both states are built per chunk and merged, so a scan holds one k x k state
+# (or one set of small contingency tables) however many rows it reads, and
+# states built by separate processes over separate rows merge into the same
+# result as one pass. Merging is associative; the states are plain numpy
+# arrays and pickle as such.
+
+import numpy as np
+
+from survey_metrics import frequency_points
+
+# Category columns with more levels than this are left out of the
+# association matrix (open text, ids)
+MAX_LEVELS = 30
+# Cells of the (rows x column pairs) code array counted per bincount
+PAIR_BATCH_CELLS = 8_000_000
+
+
+def ordinal_points(categories):
+    """Points of every category on the frequency scale, or None unless all of them are on it"""
+    points = [frequency_points(category) for category in categories]
+    if len(points) < 2 or any(p is None for p in points):
+        return None
+    return np.array(points, dtype=float)
+
+
+class CovState:
+    """Pairwise-complete means, squared deviations and co-moments of k columns.
+
+    Entry [i, j] of n, mean and m2 describes column i over the rows where
+    columns i and j are both present (so [j, i] holds column j's side), and
+    c[i, j] is their co-moment. Chunks are summarized around their own
+    column means and combined with the parallel (Chan et al.) update of
+    Welford's algorithm, which stays accurate where raw sums of squares
+    cancel.
+    """
+
+    def __init__(self, k):
+        self.n, self.mean, self.m2, self.c = (np.zeros((k, k)) for _ in range(4))
+
+    @classmethod
+    def from_batch(cls, x):
+        """State of one chunk (rows x k floats, NaN where missing)"""
+        state = cls(x.shape[1])
+        present = ~np.isnan(x)
+        m = present.astype(float)
+        shift = np.where(present, x, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+        xs = np.where(present, x - shift, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            n = m.T @ m
+            s = xs.T @ m
+            mean_s = np.where(n > 0, s / n, 0.0)
+        state.n = n
+        state.mean = np.where(n > 0, shift[:, None] + mean_s, 0.0)
+        state.m2 = (xs * xs).T @ m - s * mean_s
+        state.c = xs.T @ xs - s * mean_s.T
+        return state
+
+    def merge(self, other):
+        """Fold another state (over other rows of the same columns) into this one"""
+        n = self.n + other.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(n > 0, self.n * other.n / n, 0.0)
+            share = np.where(n > 0, other.n / n, 0.0)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * share
+        self.m2 = self.m2 + other.m2 + delta * delta * weight
+        self.c = self.c + other.c + delta * delta.T * weight
+        self.n = n
+        return self
+
+    def corr(self):
+        """Pearson correlation matrix, like DataFrame.corr() (NaN where a column is constant)"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.c / np.sqrt(self.m2 * self.m2.T)
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(np.diag(self.m2) > 0, 1.0, np.nan))
+        return corr
+
+
+class ContingencyState:
+    """Contingency table of every pair of k categorical columns with fixed levels.
+
+    Tables live back to back in one flat count array; a chunk is counted
+    for many pairs at once by offsetting each pair's cell ids into its own
+    range and running a single bincount. Merging adds the counts.
+    """
+
+    def __init__(self, levels):
+        self.levels = np.asarray(levels, dtype=np.int64)
+        k = len(self.levels)
+        self.pairs = [(i, j) for i in range(k) for j in range(i + 1, k)]
+        sizes = [self.levels[i] * self.levels[j] for i, j in self.pairs]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.counts = np.zeros(self.offsets[-1], dtype=np.int64)
+
+    def update(self, codes):
+        """Count a chunk of category codes (rows x k ints, -1 where missing)"""
+        codes = np.asarray(codes, dtype=np.int64)
+        per_batch = max(1, PAIR_BATCH_CELLS // max(1, len(codes)))
+        for start in range(0, len(self.pairs), per_batch):
+            batch = np.arange(start, min(start + per_batch, len(self.pairs)))
+            first = np.array([self.pairs[p][0] for p in batch])
+            second = np.array([self.pairs[p][1] for p in batch])
+            a, b = codes[:, first], codes[:, second]
+            cells = a * self.levels[second] + b + self.offsets[batch]
+            self.counts += np.bincount(cells[(a >= 0) & (b >= 0)], minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def table(self, p):
+        i, j = self.pairs[p]
+        return self.counts[self.offsets[p]:self.offsets[p + 1]].reshape(self.levels[i], self.levels[j])
+
+    def cramers_v(self):
+        """Cramér's V of every pair (NaN where a column has fewer than two levels present)"""
+        k = len(self.levels)
+        v = np.full((k, k), np.nan)
+        for p, (i, j) in enumerate(self.pairs):
+            v[i, j] = v[j, i] = cramers_v(self.table(p))
+        np.fill_diagonal(v, 1.0)
+        return v
+
+
+def cramers_v(table):
+    """Cramér's V of one contingency table (levels nobody chose are dropped)"""
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0].astype(float)
+    n = table.sum()
+    if min(table.shape) < 2 or n == 0:
+        return np.nan
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    return float(np.sqrt(chi2 / n / (min(table.shape) - 1)))
@@ -0,0 +1,81 @@
+# eda_cache.py
+# Content-addressed build cache for the EDA report artifacts
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+MANIFEST_FILE = "eda_manifest.json"
+
+
+def content_key(*parts):
+    """SHA-256 over strings, bytes, pandas objects and JSON-able values"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            h.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            labels = part.columns.tolist() if isinstance(part, pd.DataFrame) else [part.name]
+            h.update(repr(labels).encode("utf-8"))
+        elif isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_key(*paths):
+    """Content key of files on disk (missing files hash as absent)"""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode("utf-8"))
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                h.update(file_key(os.path.join(path, name)).encode("utf-8"))
+        elif os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+        else:
+            h.update(b"<missing>")
+    return h.hexdigest()
+
+
+class BuildCache:
+    """Manifest of artifact keys from the last run.
+
+    An entry is fresh when its key matches and every output it produced is
+    still on disk; fresh artifacts are skipped, everything else is rebuilt
+    and recorded. hits/rebuilt list entry names for the run report.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.hits = []
+        self.rebuilt = []
+
+    def fresh(self, name, key, track=True):
+        entry = self.entries.get(name)
+        ok = (entry is not None and entry["key"] == key
+              and all(os.path.exists(out) for out in entry["outputs"]))
+        if track:
+            (self.hits if ok else self.rebuilt).append(name)
+        return ok
+
+    def record(self, name, key, outputs, **extra):
+        self.entries[name] = dict(key=key, outputs=list(outputs), **extra)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def report(self):
+        return f"Build cache: {len(self.hits)} up to date, {len(self.rebuilt)} rebuilt"
@@ -0,0 +1,123 @@
+# eda_charts.py
+# Static (PNG) and interactive (HTML) chart rendering for EDA.py
+#
+# matplotlib/seaborn and plotly are imported by the renderer that needs
+# them, so a run producing only one kind of chart (or none) skips the other.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+FORMATS = ("png", "html")
+
+# One copy of plotly.js that every HTML chart references instead of embedding
+PLOTLY_JS = "plotly.min.js"
+
+
+def chart(name, kind, data, title, label=None, color=None, figsize=(6, 4), png_kind=None):
+    """Describe one section chart; rendered later by render_charts.
+
+    kind is "bar", "pie", "grouped" (a crosstab, one bar group per row),
+    "heatmap" or "line" (a trend: one line per column, label names the
+    values). data holds the counts/matrix already computed by the section,
+    so workers never receive raw rows.
+    """
+    return {"name": name, "kind": kind, "data": data, "title": title, "label": label,
+            "color": color, "figsize": figsize, "png_kind": png_kind or kind}
+
+
+def render_png(spec, out_dir="."):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    data, kind = spec["data"], spec["png_kind"]
+    if kind == "grouped":
+        data.plot(kind="bar", figsize=spec["figsize"])
+    elif kind == "line":
+        data.plot(kind="line", marker="o", color=spec["color"], figsize=spec["figsize"])
+        plt.ylabel(spec["label"] or "")
+    else:
+        plt.figure(figsize=spec["figsize"])
+        if kind == "heatmap":
+            sns.heatmap(data, annot=True, cmap="coolwarm", fmt=".2f")
+        elif kind == "pie":
+            data.plot(kind="pie", autopct="%1.1f%%")
+        else:
+            data.plot(kind=kind, color=spec["color"])
+    plt.title(spec["title"])
+    if kind == "pie":
+        plt.ylabel("")
+    path = os.path.join(out_dir, spec["name"] + ".png")
+    # Heatmaps label both axes with full question texts
+    plt.savefig(path, bbox_inches="tight" if kind == "heatmap" else None)
+    plt.close()
+    return path
+
+
+def render_html(spec, out_dir=".", include_plotlyjs=PLOTLY_JS):
+    import plotly.express as px
+
+    data, kind = spec["data"], spec["kind"]
+    if kind == "pie":
+        fig = px.pie(names=data.index, values=data.values, title=spec["title"])
+    elif kind == "grouped":
+        fig = px.bar(data, barmode="group", title=spec["title"])
+    elif kind == "line":
+        fig = px.line(data.to_frame() if data.ndim == 1 else data, markers=True,
+                      labels={"value": spec["label"] or "Value"}, title=spec["title"])
+    elif kind == "heatmap":
+        fig = px.imshow(data.values,
+                        labels=dict(x="Features", y="Features", color=spec["label"] or "Correlation"),
+                        x=data.columns.tolist(),
+                        y=data.index.tolist(),
+                        text_auto=True,
+                        color_continuous_scale="RdBu_r",
+                        title=spec["title"])
+    else:
+        fig = px.bar(x=data.index,
+                     y=data.values,
+                     labels={"x": spec["label"], "y": "Count"},
+                     title=spec["title"])
+    path = os.path.join(out_dir, spec["name"] + ".html")
+    fig.write_html(path, include_plotlyjs=include_plotlyjs)
+    return path
+
+
+def render_chart(spec, out_dir=".", include_plotlyjs=PLOTLY_JS, formats=FORMATS):
+    """Render spec in each of formats ("png", "html"); returns the paths written"""
+    paths = []
+    if "png" in formats:
+        paths.append(render_png(spec, out_dir))
+    if "html" in formats:
+        paths.append(render_html(spec, out_dir, include_plotlyjs))
+    return paths
+
+
+def write_plotlyjs(out_dir="."):
+    """Write the shared plotly.js bundle once, before any chart references it"""
+    import plotly.offline
+
+    path = os.path.join(out_dir, PLOTLY_JS)
+    bundle = plotly.offline.get_plotlyjs()
+    if not os.path.exists(path) or os.path.getsize(path) != len(bundle.encode("utf-8")):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(bundle)
+    return path
+
+
+def render_charts(specs, workers=1, out_dir=".", embed_plotlyjs=False, formats=None):
+    """Render every chart, on a process pool when workers > 1.
+
+    formats: per spec, the formats to render (default: PNG and HTML for all)
+    """
+    formats = formats or [FORMATS] * len(specs)
+    include_plotlyjs = True if embed_plotlyjs else PLOTLY_JS
+    if not embed_plotlyjs and any("html" in f for f in formats):
+        write_plotlyjs(out_dir)
+    if workers <= 1 or len(specs) <= 1:
+        return [render_chart(spec, out_dir, include_plotlyjs, f) for spec, f in zip(specs, formats)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_chart, spec, out_dir, include_plotlyjs, f)
+                   for spec, f in zip(specs, formats)]
+        return [future.result() for future in futures]
@@ -0,0 +1,297 @@
+# eda_engine.py
+# Single-scan aggregation engine behind the EDA report sections
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import survey_trace
+from eda_assoc import MAX_LEVELS, ContingencyState, CovState, ordinal_points
+from survey_data import iter_cleaned, mask_column, split_options
+from survey_rollups import trend_table
+from survey_text import TEXT_COLUMNS, TextIndex
+
+
+def section(name, columns, kind="counts", by=None, summary=None, chart=None, chart_top=None):
+    """Declare one report section.
+
+    name      sheet name in EDA_Summary.xlsx
+    columns   candidate column names; the first one present is used
+    kind      aggregation: a key of AGGREGATORS
+    by        candidate names of a second column (crosstab sections)
+    summary   text summary template; {top}, {top_count} and {counts} are filled in
+    chart     keyword arguments for eda_charts.chart (without the data)
+    chart_top chart only the first N rows of the table
+    """
+    return {"name": name, "columns": columns, "kind": kind, "by": by, "summary": summary,
+            "chart": chart, "chart_top": chart_top}
+
+
+def trend_section(name, metrics, period, chart=None):
+    """Declare a trend section: metrics (survey_rollups names) per "day" or "week".
+
+    Trends are read from the cleaner's rollups, not aggregated from the
+    responses, so they cost nothing in the scan.
+    """
+    return {**section(name, metrics, kind="trend", chart=chart), "period": period}
+
+
+def find_column(df, possible_names):
+    """Helper to detect column name variations (accepts a DataFrame or a list of names)"""
+    columns = getattr(df, "columns", df)
+    for name in possible_names:
+        if name in columns:
+            return name
+    return None
+
+
+# ---------------------------
+# Aggregators
+# ---------------------------
+# Rows kept in the table of a "terms" section
+TOP_TERMS = 50
+
+# Each one folds DataFrame chunks into a running state and turns it into a
+# table at the end, so every section shares the same pass over the data.
+def _sorted_counts(counts, name):
+    table = pd.Series(counts, dtype="int64")
+    table.index.name = name
+    return table.rename("count").sort_values(ascending=False, kind="stable")
+
+
+class CountAggregator:
+    """value_counts() of one column"""
+
+    def __init__(self, col, **_):
+        self.col = col
+        self.counts = {}
+
+    def columns(self):
+        return [self.col]
+
+    def update(self, chunk):
+        values = chunk[self.col]
+        counts = values.value_counts(sort=False)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categories come back in category order, absent ones included;
+            # keep first-appearance order so ties rank as for text columns
+            counts = counts.reindex(values.dropna().unique())
+        for value, n in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + int(n)
+
+    def result(self):
+        return _sorted_counts(self.counts, self.col)
+
+
+class SplitAggregator(CountAggregator):
+    """value_counts() of comma-separated answers, one count per listed item"""
+
+    def update(self, chunk):
+        exploded = chunk[self.col].astype(str).str.split(",").explode()
+        for value, n in exploded.value_counts(sort=False).items():
+            self.counts[value] = self.counts.get(value, 0) + int(n)
+
+
+class MultiAggregator(CountAggregator):
+    """Respondents per option of a multi-select column, from its bitmask when available"""
+
+    def __init__(self, col, options=None, available=(), **_):
+        super().__init__(col)
+        self.options = options
+        self.mask = mask_column(col) if options and mask_column(col) in available else None
+
+    def columns(self):
+        return [self.mask] if self.mask else [self.col]
+
+    def update(self, chunk):
+        if self.mask:
+            masks = chunk[self.mask].to_numpy(dtype=np.uint64)
+            for i, option in enumerate(self.options):
+                n = int(((masks >> np.uint64(i)) & np.uint64(1)).sum())
+                self.counts[option] = self.counts.get(option, 0) + n
+        else:
+            for value, n in split_options(chunk[self.col]).value_counts(sort=False).items():
+                self.counts[value] = self.counts.get(value, 0) + int(n)
+
+    def result(self):
+        return _sorted_counts({k: v for k, v in self.counts.items() if v > 0}, self.col)
+
+
+class TermAggregator:
+    """Responses per normalized term (words and word pairs) of an open-text column"""
+
+    def __init__(self, col, top=TOP_TERMS, **_):
+        self.col = col
+        self.top = top
+        self.index = TextIndex()
+
+    def columns(self):
+        return [self.col]
+
+    def update(self, chunk):
+        # Only answers not seen in earlier chunks are tokenized
+        self.index.add(chunk, columns=[self.col])
+
+    def result(self):
+        return self.index.top_terms(self.col, self.top)
+
+
+class CrosstabAggregator:
+    """pd.crosstab(df[by], df[col])"""
+
+    def __init__(self, col, by=None, **_):
+        self.col, self.by = col, by
+        self.counts = {}
+
+    def columns(self):
+        return [self.by, self.col]
+
+    def update(self, chunk):
+        for key, n in chunk.groupby([self.by, self.col], observed=True).size().items():
+            self.counts[key] = self.counts.get(key, 0) + int(n)
+
+    def result(self):
+        index = pd.MultiIndex.from_tuples(list(self.counts), names=[self.by, self.col])
+        table = pd.Series(list(self.counts.values()), index=index, dtype="int64")
+        return table.unstack(fill_value=0).sort_index().sort_index(axis=1)
+
+
+class CorrAggregator:
+    """Pearson correlation of the numeric columns, pairwise-complete like DataFrame.corr().
+
+    Columns answered on the frequency scale (Never ... Always) join as
+    their points (0-6).
+    """
+
+    def __init__(self, col=None, candidates=(), ordinal=None, **_):
+        self.candidates = [c for c in candidates if not c.endswith(" [mask]")]
+        self.ordinal = ordinal or {}
+        self.cols = None
+
+    def columns(self):
+        return self.candidates + list(self.ordinal)
+
+    def update(self, chunk):
+        if self.cols is None:
+            numeric = chunk[self.candidates].select_dtypes(include="number").columns.tolist()
+            self.cols = numeric + list(self.ordinal)
+            self.state = CovState(len(self.cols))
+        if not self.cols:
+            return
+        x = np.column_stack(
+            [chunk[col].to_numpy(dtype=float, na_value=np.nan) for col in self.cols if col not in self.ordinal]
+            + [np.append(points, np.nan)[chunk[col].cat.codes.to_numpy()] for col, points in self.ordinal.items()])
+        self.state.merge(CovState.from_batch(x))
+
+    def result(self):
+        if not self.cols:
+            return pd.DataFrame()
+        return pd.DataFrame(self.state.corr(), index=self.cols, columns=self.cols)
+
+
+class AssocAggregator:
+    """Cramér's V between every pair of categorical columns (levels fixed by the cleaner's schema)"""
+
+    def __init__(self, col=None, categories=None, **_):
+        self.categories = categories or {}
+        self.state = ContingencyState([len(levels) for levels in self.categories.values()])
+
+    def columns(self):
+        return list(self.categories)
+
+    def update(self, chunk):
+        codes = np.column_stack([pd.Categorical(chunk[col], categories=levels).codes
+                                 for col, levels in self.categories.items()])
+        self.state.update(codes)
+
+    def result(self):
+        cols = list(self.categories)
+        return pd.DataFrame(self.state.cramers_v(), index=cols, columns=cols)
+
+
+AGGREGATORS = {
+    "counts": CountAggregator,
+    "split": SplitAggregator,
+    "multi": MultiAggregator,
+    "terms": TermAggregator,
+    "crosstab": CrosstabAggregator,
+    "corr": CorrAggregator,
+    "assoc": AssocAggregator,
+}
+
+
+# ---------------------------
+# Engine
+# ---------------------------
+def categorical_columns(schema, available, options=None):
+    """{column: categories} of the schema's categorical columns fit for an association matrix:
+    present, 2..MAX_LEVELS levels, and neither multi-select nor open text"""
+    return {col: spec["categories"] for col, spec in schema.items()
+            if spec["dtype"] == "category" and col in available
+            and col not in (options or {}) and col not in TEXT_COLUMNS
+            and 2 <= len(spec["categories"]) <= MAX_LEVELS}
+
+
+def plan_sections(sections, available, numeric=(), options=None, schema=None):
+    """Resolve each section's columns and build its aggregator; unresolvable sections are dropped"""
+    planned = []
+    categorical = categorical_columns(schema or {}, available, options)
+    for spec in sections:
+        if spec["kind"] == "trend":
+            continue
+        if spec["kind"] == "corr":
+            points = {col: ordinal_points(levels) for col, levels in categorical.items()}
+            ordinal = {col: p for col, p in points.items() if p is not None}
+            aggregator = AGGREGATORS["corr"](candidates=list(numeric), ordinal=ordinal)
+            if not aggregator.columns():
+                continue
+        elif spec["kind"] == "assoc":
+            if len(categorical) < 2:
+                continue
+            aggregator = AGGREGATORS["assoc"](categories=categorical)
+        else:
+            col = find_column(available, spec["columns"])
+            by = find_column(available, spec["by"]) if spec["by"] else None
+            if col is None or (spec["by"] and by is None):
+                continue
+            aggregator = AGGREGATORS[spec["kind"]](
+                col, by=by, options=(options or {}).get(col), available=available)
+        planned.append((spec, aggregator))
+    return planned
+
+
+def run_sections(planned, batch_rows=100_000):
+    """Read the union of the sections' columns once, chunk by chunk, and feed every aggregator"""
+    columns = list(dict.fromkeys(c for _, agg in planned for c in agg.columns()))
+    # Per-section time is summed over chunks and traced once per section
+    timed = survey_trace.enabled()
+    spent = [0.0] * len(planned)
+    rows = 0
+    for chunk in iter_cleaned(columns, batch_rows=batch_rows):
+        rows += len(chunk)
+        for i, (_, aggregator) in enumerate(planned):
+            start = time.perf_counter() if timed else 0.0
+            aggregator.update(chunk)
+            if timed:
+                spent[i] += time.perf_counter() - start
+    results = [(spec, aggregator.result()) for spec, aggregator in planned]
+    if timed:
+        for (spec, _), seconds in zip(planned, spent):
+            survey_trace.record("section/" + spec["name"], seconds, rows=rows)
+    return results, rows
+
+
+def run_trends(sections, rollups):
+    """Tables of the trend sections whose metrics the rollups have (none without rollups)"""
+    if rollups is None:
+        return []
+    present = set(rollups["metric"])
+    results = []
+    for spec in sections:
+        if spec["kind"] != "trend":
+            continue
+        metrics = [metric for metric in spec["columns"] if metric in present]
+        if metrics:
+            results.append((spec, trend_table(rollups, metrics, spec["period"])))
+    return results
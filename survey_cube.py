@@ -0,0 +1,53 @@
+# survey_cube.py
+# Pre-aggregated count cube behind the Moodra KPIs and charts
+
+import numpy as np
+
+
+class SurveyCube:
+    """Respondent counts per combination of the filter dimensions.
+
+    One base cube is kept over the filter dimensions, plus one cube per
+    chart dimension over (filter dimensions + that dimension). A query
+    slices cube cells by the current selection and sums them, so its cost
+    depends on dimension cardinality rather than on respondent count.
+    """
+
+    def __init__(self, df, filter_dims, chart_dims=()):
+        self.filter_dims = list(filter_dims)
+        self._base = self._cells(df, self.filter_dims)
+        self._cubes = {dim: self._cells(df, self.filter_dims + [dim])
+                       for dim in chart_dims if dim not in self.filter_dims}
+
+    @staticmethod
+    def _cells(df, dims):
+        # dropna=False keeps rows with gaps in a dimension; like isin(), a
+        # selection never matches them, and counts() drops them per chart
+        return (df.groupby(dims, sort=False, dropna=False, observed=True)
+                .size().rename("count").reset_index())
+
+    def _slice(self, cells, selection):
+        keep = np.ones(len(cells), dtype=bool)
+        for col, values in selection.items():
+            keep &= cells[col].isin(values).to_numpy()
+        return cells[keep]
+
+    def _cube_for(self, dim):
+        return self._base if dim in self.filter_dims else self._cubes[dim]
+
+    def total(self, selection):
+        """Number of respondents matching selection"""
+        return int(self._slice(self._base, selection)["count"].sum())
+
+    def counts(self, dim, selection):
+        """Like df_filtered[dim].value_counts(): respondents per value, most common first"""
+        cells = self._slice(self._cube_for(dim), selection)
+        counts = cells.groupby(dim, sort=False, observed=True)["count"].sum()
+        counts = counts[counts > 0]
+        return counts.sort_values(ascending=False, kind="stable")
+
+    def crosstab(self, dim, by, selection):
+        """Long-form counts of (dim, by) pairs; by must be a filter dimension"""
+        cells = self._slice(self._cube_for(dim), selection)
+        grouped = cells.groupby([dim, by], sort=False, observed=True)["count"].sum()
+        return grouped[grouped > 0].reset_index()
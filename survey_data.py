@@ -0,0 +1,352 @@
+# survey_data.py
+# Shared data-loading layer for the cleaned wellbeing survey
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+CLEANED_CSV = "wellbeing_survey_res_Cleaned.csv"
+# Columnar copy written by the cleaner: a directory of Parquet parts so new
+# batches can be added without rewriting what is already there.
+CLEANED_PARQUET = "wellbeing_survey_res_Cleaned.parquet"
+# Option vocabularies of the multi-select columns, in bit order
+OPTIONS_FILE = "wellbeing_survey_res_Cleaned_options.json"
+# A uint64 bitmask holds at most this many options per column
+MAX_OPTIONS = 64
+# Compact dtype per cleaned column (categories, small ints), written by the
+# cleaner so every reader loads the CSV or Parquet copy with the same types
+SCHEMA_FILE = "wellbeing_survey_res_Cleaned_schema.json"
+
+
+def _parts(path):
+    """Files that make up a dataset path (the path itself for a plain file)"""
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith(".parquet")]
+    return [path]
+
+
+def file_signature(path):
+    """Cheap identity of a file or Parquet directory: names, mtimes and sizes"""
+    signature = []
+    for part in _parts(path):
+        st = os.stat(part)
+        signature.append((os.path.basename(part), st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of the file (or every part of a directory), read in fixed-size blocks"""
+    h = hashlib.sha256()
+    for part in _parts(path):
+        h.update(os.path.basename(part).encode("utf-8"))
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+class SurveyCache:
+    """Process-wide cache of parsed survey files.
+
+    Entries are keyed on (path, key) and validated against the file's
+    identity on every lookup. The (mtime, size) signature is checked first;
+    only when it changes is the content hash recomputed, so a file that was
+    merely touched is still served from memory.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # Re-entrant: a loader may itself read through the cache
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, path, loader, key=None):
+        """Return loader(path), reusing the cached result while the file is unchanged"""
+        path = os.path.abspath(path)
+        cache_key = (path, key)
+        with self._lock:
+            signature = file_signature(path)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry["signature"] == signature:
+                    self.hits += 1
+                    return entry["value"]
+                digest = file_digest(path)
+                if entry["digest"] == digest:
+                    entry["signature"] = signature
+                    self.hits += 1
+                    return entry["value"]
+                self.reloads += 1
+            else:
+                digest = file_digest(path)
+
+            self.misses += 1
+            value = loader(path)
+            self._entries[cache_key] = {
+                "signature": signature,
+                "digest": digest,
+                "value": value,
+            }
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "entries": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.reloads = 0
+
+
+# ---------------------------
+# Multi-select answers
+# ---------------------------
+def mask_column(col):
+    """Name of the bitmask column that encodes multi-select column col"""
+    return f"{col} [mask]"
+
+
+def split_options(series):
+    """Split multi-select answers into normalized options, one row per option.
+
+    The result is indexed by the answer's row label, so it can be grouped
+    back per respondent. Options are stripped and title-cased; "," and ";"
+    both separate options. Missing answers contribute no options.
+    """
+    tokens = (series.dropna().astype(str)
+              .str.replace(";", ",", regex=False)
+              .str.split(",")
+              .explode()
+              .str.strip()
+              .str.title())
+    return tokens[tokens != ""]
+
+
+def encode_options(tokens, options, index):
+    """Bitmask per row (uint64, bit i set for options[i]) from split_options output"""
+    codes = pd.Categorical(tokens, categories=options).codes
+    known = codes >= 0
+    rows = index.get_indexer(tokens.index[known])
+    masks = np.zeros(len(index), dtype=np.uint64)
+    np.bitwise_or.at(masks, rows, np.left_shift(np.uint64(1), codes[known].astype(np.uint64)))
+    return pd.Series(masks, index=index)
+
+
+def options_mask(options, selected):
+    """Bitmask with the bits of the selected options set"""
+    mask = 0
+    for i, option in enumerate(options):
+        if option in selected:
+            mask |= 1 << i
+    return np.uint64(mask)
+
+
+def option_counts(masks, options):
+    """Respondents per chosen option (descending, like value_counts), from a bitmask column"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    counts = pd.Series({option: int(((masks >> np.uint64(i)) & np.uint64(1)).sum())
+                        for i, option in enumerate(options)}, dtype="int64")
+    return counts[counts > 0].sort_values(ascending=False)
+
+
+def write_options(options, path=OPTIONS_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(options, f, indent=2)
+
+
+def read_options(path=OPTIONS_FILE):
+    """Option vocabulary per multi-select column ({} if the cleaner has not written one)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------
+# Typed schema
+# ---------------------------
+def _dtype(spec):
+    if spec["dtype"] == "category":
+        return pd.CategoricalDtype(spec["categories"])
+    return pd.api.types.pandas_dtype(spec["dtype"])
+
+
+def write_schema(schema, path=SCHEMA_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+
+
+def read_schema(path=SCHEMA_FILE):
+    """{column: {"dtype": ..., "categories": [...]}} ({} if the cleaner has not written one)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def apply_schema(df, schema):
+    """Cast df's columns to their schema dtypes (other columns are left alone)"""
+    for col, spec in schema.items():
+        if col in df.columns:
+            dtype = _dtype(spec)
+            if df[col].dtype != dtype:
+                df[col] = df[col].astype(dtype)
+    return df
+
+
+# ---------------------------
+# Columnar artifact
+# ---------------------------
+def _arrow_ready(df):
+    """Make object columns Arrow-friendly: multi-choice lists become the
+    survey's comma-separated form and mixed-type columns become strings"""
+    out = df.copy()
+    for col in out.select_dtypes(include=["object"]).columns:
+        values = out[col].dropna()
+        if values.empty:
+            continue
+        if values.map(lambda v: isinstance(v, list)).any():
+            out[col] = out[col].map(lambda v: ", ".join(v) if isinstance(v, list) else v)
+        elif not values.map(lambda v: isinstance(v, str)).all():
+            out[col] = out[col].map(lambda v: v if pd.isna(v) else str(v))
+    return out
+
+
+def write_columnar(df, path=CLEANED_PARQUET, append=False):
+    """Write df as a Parquet part under path; replaces existing parts unless append"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(path, exist_ok=True)
+    existing = _parts(path)
+    table = pa.Table.from_pandas(_arrow_ready(df), preserve_index=False)
+    # Category codes as int32 whatever the number of categories, so parts
+    # written after the categories grew still cast to the first one's schema
+    table = table.cast(pa.schema([
+        pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type, field.type.ordered))
+        if pa.types.is_dictionary(field.type) else field
+        for field in table.schema], metadata=table.schema.metadata))
+    if append and existing:
+        # Keep every part on the schema of the first so the directory stays
+        # readable as one dataset.
+        table = table.cast(pq.read_schema(existing[0]))
+    else:
+        for part in existing:
+            os.remove(part)
+        existing = []
+    part_path = os.path.join(path, f"part-{len(existing):05d}.parquet")
+    pq.write_table(table, part_path)
+    return part_path
+
+
+def cleaned_source():
+    """Path to read the cleaned survey from: the Parquet artifact if present, else the CSV"""
+    if os.path.isdir(CLEANED_PARQUET) and _parts(CLEANED_PARQUET):
+        return CLEANED_PARQUET
+    return CLEANED_CSV
+
+
+def available_columns(numeric_only=False):
+    """Column names of the cleaned survey without loading any rows.
+
+    The CSV carries no types, so numeric_only returns every CSV column there;
+    callers only use it to decide what to read.
+    """
+    source = cleaned_source()
+    if source == CLEANED_PARQUET:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Every part shares the first part's schema (see write_columnar)
+        schema = pq.read_schema(_parts(source)[0])
+        return [field.name for field in schema
+                if not numeric_only
+                or pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+    return pd.read_csv(source, nrows=0, encoding="utf-8").columns.tolist()
+
+
+def read_cleaned(columns=None):
+    """Read the cleaned survey, restricted to columns (names missing from the file are ignored)"""
+    source = cleaned_source()
+    return _read(source, tuple(columns) if columns is not None else None)
+
+
+def iter_cleaned(columns=None, batch_rows=100_000):
+    """Yield the cleaned survey as DataFrames of at most batch_rows rows (one pass, bounded memory)"""
+    source = cleaned_source()
+    if columns is not None:
+        present = set(available_columns())
+        columns = [c for c in dict.fromkeys(columns) if c in present]
+    schema = read_schema()
+    if os.path.isdir(source):
+        import pyarrow.dataset as pads
+
+        dataset = pads.dataset(source, format="parquet")
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+            yield apply_schema(batch.to_pandas(), schema)
+    else:
+        yield from pd.read_csv(source, usecols=columns, encoding="utf-8", chunksize=batch_rows,
+                               dtype=_csv_dtypes(schema, columns))
+
+
+def iter_selected(mask, batch_rows=100_000):
+    """Yield every column of the cleaned survey's rows where mask is set, a batch at a time"""
+    start = 0
+    for batch in iter_cleaned(batch_rows=batch_rows):
+        rows = mask[start:start + len(batch)]
+        start += len(batch)
+        if rows.any():
+            yield batch[rows]
+
+
+def _read(source, columns):
+    if columns is not None:
+        present = set(available_columns())
+        columns = [c for c in dict.fromkeys(columns) if c in present]
+    schema = read_schema()
+    if os.path.isdir(source):
+        return apply_schema(pd.read_parquet(source, columns=columns), schema)
+    return pd.read_csv(source, usecols=columns, encoding="utf-8", dtype=_csv_dtypes(schema, columns))
+
+
+def _csv_dtypes(schema, columns):
+    # Parse straight into the compact dtypes instead of converting afterwards
+    return {col: _dtype(spec) for col, spec in schema.items() if columns is None or col in columns}
+
+
+# One cache per process: Streamlit imports this module once and shares it
+# across every session and rerun.
+_cache = SurveyCache()
+
+
+def load_cleaned(columns=None):
+    """Load the cleaned survey (optionally only some columns), parsing the
+    source only when its identity changes"""
+    key = tuple(columns) if columns is not None else None
+    return _cache.get(cleaned_source(), lambda p: _read(p, key), key=key)
+
+
+def load_derived(key, build):
+    """Cache build() alongside the cleaned data; rebuilt whenever the source changes"""
+    return _cache.get(cleaned_source(), lambda p: build(), key=("derived",) + tuple(key))
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,277 @@
+# survey_engine.py
+# Filter -> counts query engine behind the Moodra dashboard and survey_service.py
+
+import argparse
+import inspect
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from survey_cube import SurveyCube
+from survey_data import (OPTIONS_FILE, SCHEMA_FILE, available_columns, cleaned_source, file_digest,
+                         file_signature, iter_selected, load_cleaned, load_derived, mask_column, read_options,
+                         split_options)
+from survey_export import EXPORT_CHUNK_ROWS, cached_export, selection_signature
+from survey_filters import FilterIndex
+from survey_lru import LRUCache
+from survey_metrics import STRESS_LEVEL_COL, STRESS_SCORE_COL
+from survey_rollups import TIME_COL, load_rollups, trend
+from survey_text import SEARCH_KEY, TEXT_COLUMNS, TEXT_INDEX_FILE, TextIndex, read_text_index
+
+DASHBOARD_COLUMNS = [
+    "Age (years)",
+    "Gender (optional)",
+    "Primary role",
+    "Overall mood today",
+    "How often do you journal?",
+    "Average sleep hours per night (past 2 weeks)",
+    "I am concerned about privacy of my journals.",
+]
+BASE_FILTERS = ["Age (years)", "Gender (optional)", "Primary role"]
+# Count cube dimensions besides the filters: every charted column
+CHART_COLUMNS = [
+    "Overall mood today",
+    "How often do you journal?",
+    "Average sleep hours per night (past 2 weeks)",
+    "I am concerned about privacy of my journals.",
+]
+# "sqlite" answers queries from the cleaner's SQLite copy instead of memory
+BACKEND_ENV = "SURVEY_BACKEND"
+# Pickled in-memory engine a dashboard can boot from instead of building one
+SNAPSHOT_FILE = "wellbeing_survey_res_Cleaned_engine.pickle"
+
+
+def dashboard_layout(all_columns=None, options=None):
+    """Column roles of the dashboard, resolved against the cleaned data's columns"""
+    if all_columns is None:
+        all_columns = available_columns()
+    if options is None:
+        options = read_options()
+    # The cleaner's stress bands; other exports may carry their own stress column
+    stress_col = STRESS_LEVEL_COL if STRESS_LEVEL_COL in all_columns else next(
+        (col for col in all_columns if "stress" in col.lower() and col != STRESS_SCORE_COL), None)
+    range_columns = [col for col in (STRESS_SCORE_COL,) if col in all_columns]
+    time_col = TIME_COL if TIME_COL in all_columns else None
+    apps_col = next((col for col in all_columns
+                     if "apps" in col.lower() and col.endswith("(select all that apply)")), None)
+    apps_options = options.get(apps_col) if apps_col else None
+    apps_mask = mask_column(apps_col) if apps_options and mask_column(apps_col) in all_columns else None
+    text_columns = [col for col in TEXT_COLUMNS if col in all_columns]
+    return {
+        "columns": all_columns,
+        "stress_col": stress_col,
+        "apps_col": apps_col,
+        "apps_options": apps_options,
+        "filter_columns": BASE_FILTERS + ([stress_col] if stress_col else []),
+        "chart_columns": CHART_COLUMNS,
+        "text_columns": text_columns,
+        "range_columns": range_columns,
+        # Selected by date range ["YYYY-MM-DD", "YYYY-MM-DD"], like a range column
+        "time_col": time_col,
+        # The apps filter only needs the answers' bitmask when there is one
+        "load_columns": (DASHBOARD_COLUMNS + [c for c in (stress_col, apps_mask or apps_col, time_col) if c]
+                         + range_columns + text_columns),
+    }
+
+
+def _plain(value):
+    """JSON-friendly scalar (numpy ints/floats become Python numbers)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class QueryEngine:
+    """JSON query dispatch shared by the engines (see survey_service.py)"""
+
+    def run(self, query):
+        """Answer one JSON query: {"op": "total" | "counts" | "crosstab" | "values" | "trend", ...}"""
+        op = query["op"]
+        selection = query.get("selection", {})
+        if op == "total":
+            return self.total(selection)
+        if op == "counts":
+            counts = self.counts(query["dim"], selection)
+            return [[_plain(k), int(n)] for k, n in counts.items()]
+        if op == "crosstab":
+            pairs = self.crosstab(query["dim"], query["by"], selection)
+            return [[_plain(a), _plain(b), int(n)] for a, b, n in pairs.itertuples(index=False)]
+        if op == "values":
+            return [_plain(v) for v in self.values(query["col"])]
+        if op == "trend":
+            table = self.trend(query["metric"], query["period"], *query.get("dates", []))
+            if table is None:
+                return None
+            return [[start.date().isoformat(), key, _plain(value)] for start, key, value in table.itertuples(index=False)]
+        raise ValueError(f"Unknown query op: {op!r}")
+
+    def trend(self, metric, period, first=None, last=None):
+        """metric per day or week from the cleaner's rollups (None if it wrote none);
+        see survey_rollups.trend"""
+        rollups = load_rollups()
+        return None if rollups is None else trend(rollups, metric, period, first, last)
+
+
+class SurveyEngine(QueryEngine):
+    """Bitmap filter index plus count cube over the dashboard's columns.
+
+    Selections are {column: selected values}; each column must match one of
+    its values. Multi-select columns match respondents who chose any of the
+    selected options, range columns take [low, high] (the time column: first
+    and last day, through a time-sorted index), and {SEARCH_KEY:
+    [query]} matches those whose open-text answers contain the query's
+    terms. None of these decompose over cube cells, so such selections
+    count from a cube over the matching rows (a few are kept).
+    """
+
+    def __init__(self, df, layout, version=None):
+        self.version = version
+        self.layout = layout
+        self.columns = df.columns.tolist()
+        self.filter_columns = layout["filter_columns"]
+        self.chart_columns = layout["chart_columns"]
+        multi = {}
+        if layout["apps_col"]:
+            apps_col = layout["apps_col"]
+            multi[apps_col] = layout["apps_options"] or sorted(split_options(df[apps_col]).unique())
+        self.multi = set(multi)
+        self.ranges = set(layout.get("range_columns", []))
+        time_col = layout.get("time_col")
+        if time_col:
+            self.ranges.add(time_col)
+            if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
+                df = df.assign(**{time_col: pd.to_datetime(df[time_col], errors="coerce")})
+        self.df = df
+        self.index = FilterIndex(df, self.filter_columns, multi, self.ranges)
+        self.cube = SurveyCube(df, self.filter_columns, self.chart_columns)
+        self._narrowed = LRUCache(max_entries=8)
+        # The cleaner's index when there is one, else one over the loaded answers
+        text_columns = layout.get("text_columns", [])
+        self.text = read_text_index() or TextIndex().add(df[text_columns])
+        self._text_codes = {col: self.text.row_codes(col, df[col]) for col in text_columns}
+
+    def __getstate__(self):
+        # Narrowed cubes are rebuilt on demand (and the cache holds a lock)
+        return {k: v for k, v in self.__dict__.items() if k != "_narrowed"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._narrowed = LRUCache(max_entries=8)
+
+    def values(self, col):
+        """Distinct values (or options) of a filter column, in order of first appearance"""
+        return self.index.values(col)
+
+    def select(self, selection):
+        """Boolean row mask of the respondents matching selection"""
+        mask = self.index.select({col: values for col, values in selection.items() if col != SEARCH_KEY})
+        for query in selection.get(SEARCH_KEY, []):
+            if self._text_codes:
+                mask &= self.text.match(self._text_codes, query)
+        return mask
+
+    def _source(self, selection):
+        if not (self.multi | self.ranges).intersection(selection) and SEARCH_KEY not in selection:
+            return self.cube, selection
+        key = selection_signature(selection)
+        return self._narrowed.get(key, lambda: SurveyCube(
+            self.df[self.select(selection)], self.filter_columns, self.chart_columns)), {}
+
+    def total(self, selection):
+        cube, cells = self._source(selection)
+        return cube.total(cells)
+
+    def counts(self, dim, selection):
+        cube, cells = self._source(selection)
+        return cube.counts(dim, cells)
+
+    def crosstab(self, dim, by, selection):
+        cube, cells = self._source(selection)
+        return cube.crosstab(dim, by, cells)
+
+    def prefetch(self, queries):
+        """Nothing to do in-process; the remote engine batches these into one request"""
+
+    def export(self, fmt, selection):
+        """CSV/XLSX bytes of every column for the matching respondents (cached).
+
+        The rows are read from the cleaned data a batch at a time, so no
+        all-column frame is loaded (or kept in the shared data cache).
+        """
+        key = (self.version, selection_signature(selection))
+        return cached_export(key, fmt, available_columns(),
+                             lambda: iter_selected(self.select(selection), EXPORT_CHUNK_ROWS))
+
+
+def build_engine():
+    layout = dashboard_layout()
+    df = load_cleaned(layout["load_columns"])
+    return SurveyEngine(df, layout, version=file_signature(cleaned_source()))
+
+
+# ---------------------------
+# Snapshot
+# ---------------------------
+def _snapshot_inputs():
+    """{name: path} of what an engine is built from: the cleaner's outputs and the indexing code"""
+    code = [inspect.getfile(obj) for obj in (build_engine, SurveyCube, FilterIndex, TextIndex, load_cleaned)]
+    paths = [cleaned_source(), OPTIONS_FILE, SCHEMA_FILE, TEXT_INDEX_FILE] + code
+    return {os.path.basename(path): path for path in paths if os.path.exists(path)}
+
+
+def write_snapshot(path=SNAPSHOT_FILE):
+    """Build the engine and pickle it, after the signature and digest of every input"""
+    inputs = {name: (file_signature(p), file_digest(p)) for name, p in _snapshot_inputs().items()}
+    engine = build_engine()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(inputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return engine
+
+
+def read_snapshot(path=SNAPSHOT_FILE):
+    """The snapshot's engine, or None when there is none or any input changed since it was written.
+
+    Inputs are compared by signature, and by digest where that differs (a
+    copy of the same files on a new replica still matches).
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        inputs = pickle.load(f)
+        current = _snapshot_inputs()
+        if set(inputs) != set(current):
+            return None
+        for name, (signature, digest) in inputs.items():
+            if file_signature(current[name]) != signature and file_digest(current[name]) != digest:
+                return None
+        engine = pickle.load(f)
+    engine.version = file_signature(cleaned_source())
+    return engine
+
+
+def load_engine():
+    """The engine over the current cleaned data, once per data version: from the
+    snapshot when it is current, else built"""
+    return load_derived(["engine"], lambda: read_snapshot() or build_engine())
+
+
+def open_engine():
+    """The engine this process should query: SQLite when SURVEY_BACKEND=sqlite, else in memory"""
+    if os.environ.get(BACKEND_ENV) == "sqlite":
+        from survey_sqlite import load_sqlite_engine
+        return load_sqlite_engine()
+    return load_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild the dashboard's in-memory query engine.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE,
+                        help="file to pickle the engine to, for replicas to boot from")
+    args = parser.parse_args()
+    # Through the module, so the pickle names survey_engine.SurveyEngine rather than __main__'s
+    import survey_engine
+    survey_engine.write_snapshot(args.snapshot)
+    print(f"✅ Engine snapshot saved as: {args.snapshot}")
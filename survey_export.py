@@ -0,0 +1,71 @@
+# survey_export.py
+# On-demand CSV/Excel exports of filtered survey rows, cached by filter signature
+
+from io import BytesIO
+
+import pandas as pd
+
+from survey_lru import LRUCache
+
+# Rows read and serialized at a time, so an export never holds more of them
+EXPORT_CHUNK_ROWS = 50_000
+# Bounds for the built files kept across sessions
+EXPORT_CACHE_ENTRIES = 8
+EXPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def export_columns(columns):
+    """Columns that go into an export (bitmask encodings are left out); columns may be a frame"""
+    return [col for col in columns if not col.endswith(" [mask]")]
+
+
+def selection_signature(selection):
+    """Hashable, order-independent key for a {column: selected values} filter"""
+    return tuple(sorted((col, tuple(sorted(map(str, values)))) for col, values in selection.items()))
+
+
+def export_csv(columns, chunks):
+    """CSV bytes of the frames chunks yields (restricted to columns), written one frame at a time"""
+    buffer = BytesIO()
+    pd.DataFrame(columns=columns).to_csv(buffer, index=False, encoding="utf-8")
+    for chunk in chunks:
+        chunk[columns].to_csv(buffer, index=False, header=False, encoding="utf-8")
+    return buffer.getvalue()
+
+
+def _cell(value):
+    return None if pd.isna(value) else value
+
+
+def export_excel(columns, chunks):
+    """XLSX bytes of the frames chunks yields (restricted to columns), streamed through
+    openpyxl's write-only mode"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(columns)
+    for chunk in chunks:
+        for record in chunk[columns].itertuples(index=False, name=None):
+            sheet.append([_cell(value) for value in record])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# Shared by every session of the dashboard process
+_exports = LRUCache(EXPORT_CACHE_ENTRIES, EXPORT_CACHE_BYTES, size=len)
+
+
+def cached_export(key, fmt, columns, chunks):
+    """Build (or reuse) the fmt ("csv" or "xlsx") export of the frames chunks() yields.
+
+    chunks is only called on a cache miss, and a build holds the file
+    being written plus one frame of rows (of at most EXPORT_CHUNK_ROWS).
+    """
+    build = export_csv if fmt == "csv" else export_excel
+    return _exports.get(key + (fmt,), lambda: build(export_columns(columns), chunks()))
+
+
+def export_stats():
+    return _exports.stats()
@@ -0,0 +1,30 @@
+# survey_figures.py
+# Shared LRU cache of built Plotly figures for the Moodra dashboard
+
+from survey_lru import LRUCache
+
+# Bounds for the figures kept across sessions and reruns
+FIGURE_CACHE_ENTRIES = 512
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def figure_bytes(fig):
+    """Size of a figure as sent to the browser"""
+    return len(fig.to_json())
+
+
+# Shared by every session of the dashboard process
+_figures = LRUCache(FIGURE_CACHE_ENTRIES, FIGURE_CACHE_BYTES, size=figure_bytes)
+
+
+def cached_figure(key, build):
+    """Return the figure cached under key, calling build() to make it on a miss.
+
+    Callers must not modify the returned figure; it may be drawn by other
+    sessions too.
+    """
+    return _figures.get(key, build)
+
+
+def figure_stats():
+    return _figures.stats()
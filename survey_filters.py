@@ -0,0 +1,118 @@
+# survey_filters.py
+# Precomputed bitmap index behind the Moodra sidebar filters
+
+import numpy as np
+import pandas as pd
+
+from survey_data import mask_column, split_options
+
+
+class SortedIndex:
+    """Row positions ordered by a numeric or datetime column.
+
+    A range selection is two binary searches into the sorted values plus
+    marking the rows between them; rows without a value never match.
+    Datetime columns are bounded and selected by whole days ("YYYY-MM-DD").
+    """
+
+    def __init__(self, series):
+        self.dates = pd.api.types.is_datetime64_any_dtype(series)
+        if self.dates:
+            values = series.to_numpy(dtype="datetime64[ns]")
+            valid = ~np.isnat(values)
+        else:
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+        self.n = len(values)
+        rows = np.flatnonzero(valid)
+        order = np.argsort(values[rows], kind="stable")
+        self.rows = rows[order]
+        self.values = values[rows][order]
+
+    def bounds(self):
+        """[lowest, highest] value ([] when the column is empty)"""
+        if not len(self.values):
+            return []
+        if self.dates:
+            return [str(self.values[0].astype("datetime64[D]")), str(self.values[-1].astype("datetime64[D]"))]
+        return [_number(self.values[0]), _number(self.values[-1])]
+
+    def select(self, lo, hi):
+        """Boolean row mask of lo <= value <= hi (for dates: from the start of day lo to the end of day hi)"""
+        if self.dates:
+            lo = np.datetime64(lo, "D").astype("datetime64[ns]")
+            hi = (np.datetime64(hi, "D") + 1).astype("datetime64[ns]")
+            end = np.searchsorted(self.values, hi, side="left")
+        else:
+            end = np.searchsorted(self.values, hi, side="right")
+        start = np.searchsorted(self.values, lo, side="left")
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.rows[start:end]] = True
+        return mask
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class FilterIndex:
+    """One packed bitset per distinct value of each filter column.
+
+    A selection is answered as an AND across columns of the OR of the
+    selected values' bitsets, so a filter change touches n/8 bytes per
+    selected value instead of rescanning and comparing every row.
+
+    Multi-select columns are indexed per option, and selecting options
+    matches respondents who chose any of them. Range columns are selected
+    with [low, high] through a SortedIndex.
+    """
+
+    def __init__(self, df, columns, multi=None, ranges=()):
+        self.n = len(df)
+        self._values = {}
+        self._bitsets = {}
+        for col in columns:
+            codes, uniques = pd.factorize(df[col])
+            self._values[col] = list(uniques)
+            self._bitsets[col] = {value: np.packbits(codes == i) for i, value in enumerate(uniques)}
+        for col, options in (multi or {}).items():
+            self._values[col] = list(options)
+            self._bitsets[col] = self._option_bitsets(df, col, options)
+        self._ranges = {col: SortedIndex(df[col]) for col in ranges}
+
+    def _option_bitsets(self, df, col, options):
+        if mask_column(col) in df.columns:
+            masks = df[mask_column(col)].to_numpy(dtype=np.uint64)
+            return {option: np.packbits(((masks >> np.uint64(i)) & np.uint64(1)).astype(bool))
+                    for i, option in enumerate(options)}
+        tokens = split_options(df[col])
+        rows = df.index.get_indexer(tokens.index)
+        bitsets = {}
+        for option in options:
+            hit = np.zeros(self.n, dtype=bool)
+            hit[rows[(tokens == option).to_numpy()]] = True
+            bitsets[option] = np.packbits(hit)
+        return bitsets
+
+    def values(self, col):
+        """Distinct values of col in order of first appearance (options for a widget);
+        [lowest, highest] for a range column"""
+        if col in self._ranges:
+            return self._ranges[col].bounds()
+        return self._values[col]
+
+    def select(self, selection):
+        """Boolean row mask for {column: selected values}; each column must match one of its
+        values (a range column: [low, high])"""
+        result = np.packbits(np.ones(self.n, dtype=bool))
+        for col, selected in selection.items():
+            if col in self._ranges:
+                result &= np.packbits(self._ranges[col].select(*selected))
+                continue
+            bitsets = self._bitsets[col]
+            any_of = np.zeros_like(result)
+            for value in selected:
+                if value in bitsets:
+                    any_of |= bitsets[value]
+            result &= any_of
+        return np.unpackbits(result, count=self.n).astype(bool)
@@ -0,0 +1,49 @@
+# survey_lru.py
+# Thread-safe LRU cache shared by the export, figure, query and service caches
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """LRU cache bounded by entry count and, when size is given, total bytes.
+
+    size(value) gives an entry's byte count; without it only max_entries
+    bounds the cache. A value is built outside the lock, so concurrent
+    misses on one key may build it twice; the first result is kept.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=None, size=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Return the value cached under key, calling build() to make it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+        value = build()
+        size = self.size(value) if self.size is not None else 0
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries and (self.max_bytes is None or size <= self.max_bytes):
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while len(self._entries) > self.max_entries or (
+                        self.max_bytes is not None and self._bytes > self.max_bytes):
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,71 @@
+# survey_metrics.py
+# Derived metrics of the cleaned survey: composite stress score and bands
+#
+# The four "In the last 2 weeks, how often..." items follow the Perceived
+# Stress Scale: each answer on the form's frequency scale is a point from
+# 0 (Never) to 6 (Always), the two positively-worded items are reversed
+# (6 - points), and the score is the sum (0-24). Bands split the range in
+# thirds.
+
+import numpy as np
+import pandas as pd
+
+FREQUENCY_SCALE = ["Never", "Rarely", "Sometimes", "Weekly", "2-3x/week", "Daily", "Always"]
+# Case- and space-insensitive lookup of an answer's points
+FREQUENCY_LOOKUP = {answer.lower(): points for points, answer in enumerate(FREQUENCY_SCALE)}
+SCALE_MAX = len(FREQUENCY_SCALE) - 1
+
+STRESS_ITEMS = [
+    "In the last 2 weeks, how often did you feel overwhelmed?",
+    "In the last 2 weeks, how often did you feel things were going your way? (reverse-scored)",
+    "In the last 2 weeks, how often did you feel confident about handling personal problems? (reverse-scored)",
+    "In the last 2 weeks, how often did you feel difficulties were piling up too high?",
+]
+REVERSE_MARK = "(reverse-scored)"
+
+STRESS_SCORE_COL = "Stress Score"
+STRESS_LEVEL_COL = "Stress Level"
+SCORE_MAX = SCALE_MAX * len(STRESS_ITEMS)
+# Band -> highest score in it
+STRESS_BANDS = {"Low": 8, "Moderate": 16, "High": SCORE_MAX}
+
+
+def frequency_points(answer):
+    """Points of one answer on the frequency scale (None if it is not on the scale)"""
+    if answer is None or pd.isna(answer):
+        return None
+    return FREQUENCY_LOOKUP.get(str(answer).strip().lower())
+
+
+def item_points(series):
+    """Points (int8, -1 where off the scale or blank) of every answer, reversed for reverse-scored items"""
+    # Look each distinct answer up once and gather; blanks (code -1) hit the trailing -1
+    codes, answers = pd.factorize(series)
+    table = np.array([-1 if p is None else p for p in map(frequency_points, answers)] + [-1], dtype=np.int8)
+    points = table[codes]
+    if REVERSE_MARK in series.name:
+        points = np.where(points >= 0, SCALE_MAX - points, points).astype(np.int8)
+    return points
+
+
+def stress_score(df):
+    """Composite stress score per row (<NA> where any item is off the scale)"""
+    points = np.column_stack([item_points(df[col]) for col in STRESS_ITEMS])
+    scores = pd.array(points.sum(axis=1, dtype=np.int16), dtype="Int16")
+    scores[~(points >= 0).all(axis=1)] = pd.NA
+    return scores
+
+
+def stress_level(scores):
+    """Band of every score, as a categorical in band order"""
+    edges = [-1] + list(STRESS_BANDS.values())
+    return pd.cut(scores.astype("float64"), bins=edges, labels=list(STRESS_BANDS))
+
+
+def add_stress_metrics(df):
+    """Add the score and band columns when every stress item is present"""
+    if all(col in df.columns for col in STRESS_ITEMS):
+        scores = pd.Series(stress_score(df), index=df.index)
+        df[STRESS_SCORE_COL] = scores
+        df[STRESS_LEVEL_COL] = stress_level(scores)
+    return df
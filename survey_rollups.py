@@ -0,0 +1,166 @@
+# survey_rollups.py
+# Daily and weekly rollups of the key survey metrics, grown batch by batch
+#
+# One long table: (period, start, metric, key, count, total). Count metrics
+# have a row per answer (key) with the respondents giving it; mean metrics
+# keep count and total of the answers, so buckets from different batches
+# add up and a mean is total / count. The cleaner folds every batch it
+# writes into the file, so trend views read a few rows per day instead of
+# rescanning responses.
+
+import os
+
+import pandas as pd
+
+from survey_data import SurveyCache, split_options
+from survey_metrics import STRESS_BANDS, STRESS_LEVEL_COL, STRESS_SCORE_COL
+
+ROLLUP_FILE = "wellbeing_survey_res_Cleaned_rollups.parquet"
+TIME_COL = "Timestamp"
+PERIODS = ["day", "week"]
+
+RESPONSES = "responses"
+# Respondents per answer
+COUNT_METRICS = ["Primary role", "Overall mood today", STRESS_LEVEL_COL]
+# Respondents per option of a multi-select column
+OPTION_METRICS = ["Which wellness/mental health apps have you used in the last 6 months? (select all that apply)"]
+# Mean answer
+MEAN_METRICS = [
+    "I am concerned about privacy of my journals.",
+    "I prefer on-device processing even if features are limited.",
+    "I am okay with personalized nudges if they help my wellbeing.",
+    "I am willing to share anonymized analytics for research.",
+    STRESS_SCORE_COL,
+]
+
+# Answer order of trend tables (others are sorted)
+KEY_ORDER = {STRESS_LEVEL_COL: list(STRESS_BANDS)}
+
+KEYS = ["period", "start", "metric", "key"]
+COLUMNS = KEYS + ["count", "total"]
+
+
+def bucket_start(times, period):
+    """Start of each timestamp's day, or of its week (weeks start on Monday)"""
+    days = times.dt.floor("D")
+    if period == "week":
+        return days - pd.to_timedelta(days.dt.dayofweek, unit="D")
+    return days
+
+
+def _rows(period, metric, counts, totals=None):
+    """Rollup rows from counts indexed by start (or by (start, key))"""
+    counts = counts[counts > 0] if totals is None else counts
+    index = counts.index
+    starts = index.get_level_values(0) if isinstance(index, pd.MultiIndex) else index
+    keys = index.get_level_values(1).astype(str) if isinstance(index, pd.MultiIndex) else ""
+    return pd.DataFrame({
+        "period": period, "start": starts, "metric": metric, "key": keys,
+        "count": counts.to_numpy(dtype="int64"),
+        "total": totals.to_numpy(dtype="float64") if totals is not None else 0.0,
+    })
+
+
+def rollup(df):
+    """Rollup rows of one batch of cleaned responses (rows without a timestamp are left out)"""
+    if TIME_COL not in df.columns:
+        return pd.DataFrame(columns=COLUMNS)
+    times = pd.to_datetime(df[TIME_COL], errors="coerce")
+    parts = []
+    for period in PERIODS:
+        start = bucket_start(times, period).rename("start")
+        parts.append(_rows(period, RESPONSES, start.value_counts()))
+        for col in COUNT_METRICS:
+            if col in df.columns:
+                counts = df.groupby([start, df[col].rename("key")], observed=True).size()
+                parts.append(_rows(period, col, counts))
+        for col in OPTION_METRICS:
+            if col in df.columns:
+                tokens = split_options(df[col])
+                counts = pd.DataFrame({"start": start.loc[tokens.index].to_numpy(),
+                                       "key": tokens.to_numpy()}).groupby(["start", "key"]).size()
+                parts.append(_rows(period, col, counts))
+        for col in MEAN_METRICS:
+            if col in df.columns:
+                values = pd.to_numeric(df[col], errors="coerce").astype("float64")
+                stats = values.groupby(start).agg(["count", "sum"])
+                stats = stats[stats["count"] > 0]
+                parts.append(_rows(period, col, stats["count"], stats["sum"]))
+    return merge_rollups(*parts)
+
+
+def merge_rollups(*parts):
+    """Add rollup tables together, bucket by bucket"""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS)
+    merged = pd.concat(parts, ignore_index=True).groupby(KEYS, as_index=False, sort=True)[["count", "total"]].sum()
+    return merged[COLUMNS]
+
+
+def read_rollups(path=ROLLUP_FILE):
+    """The rollups the cleaner wrote (None if there are none)"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def update_rollups(df, append=False, path=ROLLUP_FILE, rows=None):
+    """Fold a batch of cleaned responses into the rollup file, or start it over unless append
+
+    rows: the batch's rollup(df), when it was computed elsewhere (e.g. in a worker process)
+    """
+    old = read_rollups(path) if append else None
+    merged = merge_rollups(*([old] if old is not None else []), rollup(df) if rows is None else rows)
+    tmp = path + ".tmp"
+    merged.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return merged
+
+
+_cache = SurveyCache()
+
+
+def load_rollups(path=ROLLUP_FILE):
+    """read_rollups(), parsed once per version of the file"""
+    if not os.path.exists(path):
+        return None
+    return _cache.get(path, read_rollups)
+
+
+def trend(rollups, metric, period, first=None, last=None):
+    """Long-form trend of one metric: start, key and value (respondents, or the mean answer)
+
+    first/last ("YYYY-MM-DD") keep the buckets that overlap those days.
+    """
+    rows = rollups[(rollups["period"] == period) & (rollups["metric"] == metric)]
+    if first is not None:
+        # A week starting up to 6 days earlier still overlaps the first day
+        reach = pd.Timedelta(days=6 if period == "week" else 0)
+        rows = rows[rows["start"] >= pd.Timestamp(first) - reach]
+    if last is not None:
+        rows = rows[rows["start"] <= pd.Timestamp(last)]
+    value = rows["total"] / rows["count"] if metric in MEAN_METRICS else rows["count"]
+    return pd.DataFrame({"start": rows["start"].to_numpy(), "key": rows["key"].to_numpy(),
+                         "value": value.to_numpy()})
+
+
+def trend_table(rollups, metrics, period):
+    """Wide trend of one or more metrics: a column per answer (or per metric, for means)"""
+    metrics = [metrics] if isinstance(metrics, str) else metrics
+    frames = []
+    for metric in metrics:
+        long = trend(rollups, metric, period)
+        if metric in MEAN_METRICS or metric == RESPONSES:
+            long["key"] = metric
+        frames.append(long)
+    long = pd.concat(frames, ignore_index=True)
+    table = long.pivot_table(index="start", columns="key", values="value", aggfunc="sum", sort=False)
+    table = table.sort_index()
+    table.index.name = period
+    table.columns.name = None
+    if len(metrics) == 1 and metrics[0] in KEY_ORDER:
+        table = table[[key for key in KEY_ORDER[metrics[0]] if key in table.columns]]
+    if all(metric not in MEAN_METRICS for metric in metrics):
+        table = table.fillna(0).astype("int64")
+    return table[table.columns[0]] if metrics == [RESPONSES] else table
@@ -0,0 +1,179 @@
+# survey_service.py
+# Headless aggregation service: one warm SurveyEngine shared by every dashboard replica
+#
+#   python survey_service.py --port 8765
+#   SURVEY_SERVICE_URL=http://127.0.0.1:8765 streamlit run Moodra_1.py
+#
+# GET  /meta    data version, column roles and every filter's values
+# POST /query   {"queries": [{"op": "counts", "dim": ..., "selection": {...}}, ...]}
+#               -> {"version": ..., "results": [...]}, answered in one round trip
+# POST /export  {"fmt": "csv" | "xlsx", "selection": {...}} -> file bytes
+
+import argparse
+import asyncio
+import json
+import os
+import urllib.request
+
+import pandas as pd
+
+from survey_engine import open_engine
+from survey_lru import LRUCache
+
+SERVICE_URL_ENV = "SURVEY_SERVICE_URL"
+DEFAULT_PORT = 8765
+
+# Answers to recent queries, keyed by (data version, query); shared by all clients
+RESULT_CACHE_ENTRIES = 4096
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _result_bytes(result):
+    return len(json.dumps(result))
+
+
+# ---------------------------
+# Server
+# ---------------------------
+def make_app():
+    import tornado.web
+
+    results = LRUCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES, size=_result_bytes)
+
+    class MetaHandler(tornado.web.RequestHandler):
+        def get(self):
+            engine = open_engine()
+            self.write({
+                "version": engine.version,
+                "columns": engine.columns,
+                "layout": {k: v for k, v in engine.layout.items() if k != "columns"},
+                "values": {col: engine.run({"op": "values", "col": col})
+                           for col in engine.filter_columns + sorted(engine.multi) + sorted(engine.ranges)},
+            })
+
+    class QueryHandler(tornado.web.RequestHandler):
+        def post(self):
+            queries = json.loads(self.request.body)["queries"]
+            engine = open_engine()
+            version = json.dumps(engine.version)
+            answers = []
+            for query in queries:
+                key = (version, json.dumps(query, sort_keys=True))
+                answers.append(results.get(key, lambda q=query: engine.run(q)))
+            self.write({"version": engine.version, "results": answers,
+                        "cache": results.stats()})
+
+    class ExportHandler(tornado.web.RequestHandler):
+        def post(self):
+            body = json.loads(self.request.body)
+            data = open_engine().export(body["fmt"], body.get("selection", {}))
+            self.set_header("Content-Type", "application/octet-stream")
+            self.write(data)
+
+    return tornado.web.Application([
+        (r"/meta", MetaHandler),
+        (r"/query", QueryHandler),
+        (r"/export", ExportHandler),
+    ])
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT):
+    open_engine()  # warm the data before taking requests
+    make_app().listen(port, address=host)
+    print(f"✅ Survey aggregation service on http://{host}:{port}")
+    await asyncio.Event().wait()
+
+
+# ---------------------------
+# Client
+# ---------------------------
+class RemoteEngine:
+    """SurveyEngine's query interface, answered by a running survey_service.
+
+    Meant to live for one dashboard rerun: prefetch() sends every query the
+    page will make in one request and later calls read the answers back;
+    anything not prefetched costs its own round trip.
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        meta = self._call("/meta")
+        self.version = _freeze(meta["version"])
+        self.columns = meta["columns"]
+        self.layout = {"columns": self.columns, **meta["layout"]}
+        self.filter_columns = self.layout["filter_columns"]
+        self.chart_columns = self.layout["chart_columns"]
+        self._values = meta["values"]
+        self._answers = {}
+
+    def _call(self, path, body=None, raw=False):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = response.read()
+        return payload if raw else json.loads(payload)
+
+    @staticmethod
+    def _key(query):
+        return json.dumps(query, sort_keys=True, default=_plain)
+
+    def prefetch(self, queries):
+        """Fetch the answers to every query not seen yet, in one request"""
+        missing = {self._key(q): q for q in queries if self._key(q) not in self._answers}
+        if missing:
+            reply = self._call("/query", {"queries": [json.loads(k) for k in missing]})
+            self._answers.update(zip(missing, reply["results"]))
+
+    def _ask(self, query):
+        self.prefetch([query])
+        return self._answers[self._key(query)]
+
+    def values(self, col):
+        return self._values[col]
+
+    def total(self, selection):
+        return self._ask({"op": "total", "selection": selection})
+
+    def counts(self, dim, selection):
+        pairs = self._ask({"op": "counts", "dim": dim, "selection": selection})
+        return pd.Series([n for _, n in pairs], index=pd.Index([k for k, _ in pairs], name=dim),
+                         name="count", dtype="int64")
+
+    def crosstab(self, dim, by, selection):
+        rows = self._ask({"op": "crosstab", "dim": dim, "by": by, "selection": selection})
+        return pd.DataFrame(rows, columns=[dim, by, "count"])
+
+    def trend(self, metric, period, first=None, last=None):
+        dates = [first, last] if first is not None else []
+        rows = self._ask({"op": "trend", "metric": metric, "period": period, "dates": dates})
+        if rows is None:
+            return None
+        table = pd.DataFrame(rows, columns=["start", "key", "value"])
+        table["start"] = pd.to_datetime(table["start"])
+        return table
+
+    def export(self, fmt, selection):
+        return self._call("/export", {"fmt": fmt, "selection": selection}, raw=True)
+
+
+def _plain(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _freeze(value):
+    return tuple(_freeze(v) for v in value) if isinstance(value, list) else value
+
+
+def service_url():
+    """URL of the aggregation service the dashboard should use, if any"""
+    return os.environ.get(SERVICE_URL_ENV) or None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve survey filter/count queries over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,306 @@
+# survey_sqlite.py
+# Optional SQLite copy of the cleaned survey, queried in place by the dashboard
+#
+#   python wellbeing_survey_res_Cleaning.py --sqlite
+#   SURVEY_BACKEND=sqlite streamlit run Moodra_1.py
+#
+# Tables:
+#   responses       one row per respondent (row_id, then the cleaned columns),
+#                   indexed on every dashboard filter column
+#   choices         (choice_id, col, option) every multi-select option seen
+#   answer_options  (choice_id, row_id) per chosen option, clustered by option
+#   options         (col, bit, option) option vocabularies, in bit order
+#   meta            (key, value) JSON such as the typed schema
+#   text_*          the open-text index (see survey_text), searched in SQL
+
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from survey_data import apply_schema, file_signature, mask_column, split_options
+from survey_engine import BASE_FILTERS, QueryEngine, dashboard_layout
+from survey_export import EXPORT_CHUNK_ROWS, cached_export, selection_signature
+from survey_lru import LRUCache
+from survey_rollups import ROLLUP_FILE, TIME_COL, load_rollups, trend
+from survey_text import (ANSWERS_TABLE as TEXT_ANSWERS_TABLE, POSTINGS_TABLE as TEXT_POSTINGS_TABLE, SEARCH_KEY,
+                         TextIndex, query_terms, store_text_index)
+
+CLEANED_SQLITE = "wellbeing_survey_res_Cleaned.sqlite"
+TABLE = "responses"
+CHOICES_TABLE = "choices"
+ANSWERS_TABLE = "answer_options"
+OPTIONS_TABLE = "options"
+META_TABLE = "meta"
+# Indexed besides the base filters: mood, the timestamp and any stress column
+INDEXED_COLUMNS = BASE_FILTERS + ["Overall mood today", TIME_COL]
+
+# Count query results kept per engine (engines are per database version)
+QUERY_CACHE_ENTRIES = 1024
+
+
+def _quote(name):
+    """SQL identifier for a column name (they contain spaces, ? and /)"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# ---------------------------
+# Writing (cleaner side)
+# ---------------------------
+def _indexed(columns):
+    return [col for col in columns if col in INDEXED_COLUMNS or "stress" in col.lower()]
+
+
+def _create(con, rows):
+    con.execute(pd.io.sql.get_schema(rows, TABLE, keys="row_id", con=con))
+    for i, col in enumerate(_indexed(rows.columns)):
+        con.execute(f"CREATE INDEX idx_{TABLE}_{i} ON {TABLE} ({_quote(col)})")
+    con.execute(f"CREATE TABLE {CHOICES_TABLE} (choice_id INTEGER PRIMARY KEY, col TEXT, option TEXT, "
+                "UNIQUE (col, option))")
+    con.execute(f"CREATE TABLE {ANSWERS_TABLE} (choice_id INTEGER, row_id INTEGER, "
+                "PRIMARY KEY (choice_id, row_id)) WITHOUT ROWID")
+
+
+def _choice_ids(con, col, options):
+    con.executemany(f"INSERT OR IGNORE INTO {CHOICES_TABLE} (col, option) VALUES (?, ?)",
+                    [(col, option) for option in options])
+    return dict(con.execute(f"SELECT option, choice_id FROM {CHOICES_TABLE} WHERE col = ?", (col,)))
+
+
+def write_sqlite(df, path=CLEANED_SQLITE, append=False, text_index=None):
+    """Write cleaned rows to the SQLite copy; replaces its rows unless append.
+
+    Appends are plain INSERTs (indexes are updated in place), so adding a
+    batch costs the batch, not the table. text_index: the batch's
+    TextIndex().add(df), when it was built elsewhere.
+    """
+    multi = [col for col in df.columns if mask_column(col) in df.columns]
+    rows = df[[col for col in df.columns if not col.endswith(" [mask]")]].copy()
+    for col in rows.select_dtypes(include=["datetime"]).columns:
+        # Same text as the cleaned CSV
+        rows[col] = rows[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            exists = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (TABLE,)).fetchone() is not None
+            if exists and not append:
+                con.execute(f"DROP TABLE {TABLE}")
+                con.execute(f"DROP TABLE IF EXISTS {CHOICES_TABLE}")
+                con.execute(f"DROP TABLE IF EXISTS {ANSWERS_TABLE}")
+                exists = False
+            start = con.execute(f"SELECT COALESCE(MAX(row_id), 0) FROM {TABLE}").fetchone()[0] if exists else 0
+            row_ids = np.arange(start + 1, start + 1 + len(rows))
+            rows.insert(0, "row_id", row_ids)
+            if not exists:
+                _create(con, rows)
+            rows.to_sql(TABLE, con, if_exists="append", index=False)
+            for col in multi:
+                tokens = split_options(df[col])
+                answers = pd.DataFrame({
+                    "choice_id": tokens.map(_choice_ids(con, col, tokens.unique())).to_numpy(),
+                    "row_id": row_ids[df.index.get_indexer(tokens.index)],
+                }).drop_duplicates().sort_values(["choice_id", "row_id"])
+                con.executemany(f"INSERT INTO {ANSWERS_TABLE} VALUES (?, ?)",
+                                answers.itertuples(index=False, name=None))
+            store_text_index(con, TextIndex().add(df) if text_index is None else text_index, append=exists)
+    finally:
+        con.close()
+    return path
+
+
+def write_sqlite_meta(options, schema, path=CLEANED_SQLITE):
+    """Store the option vocabularies and typed schema next to the rows"""
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            con.execute(f"CREATE TABLE IF NOT EXISTS {OPTIONS_TABLE} (col TEXT, bit INTEGER, option TEXT)")
+            con.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+            con.execute(f"DELETE FROM {OPTIONS_TABLE}")
+            con.executemany(f"INSERT INTO {OPTIONS_TABLE} VALUES (?, ?, ?)",
+                            [(col, bit, option) for col, vocab in options.items()
+                             for bit, option in enumerate(vocab)])
+            con.execute(f"INSERT OR REPLACE INTO {META_TABLE} VALUES ('schema', ?)", (json.dumps(schema),))
+    finally:
+        con.close()
+
+
+# ---------------------------
+# Querying (dashboard side)
+# ---------------------------
+class SqliteEngine(QueryEngine):
+    """SurveyEngine's query interface, answered by SQL against the SQLite copy.
+
+    Filters become WHERE clauses on the indexed columns (multi-select
+    options match through answer_options) and counts are GROUP BYs, so
+    only result rows are held in memory. A filter left on all of its values
+    is sent as IS NOT NULL rather than a long IN list.
+    """
+
+    def __init__(self, path=CLEANED_SQLITE):
+        self.path = path
+        self.version = file_signature(path)
+        self._local = threading.local()
+        con = self._connection()
+        self.columns = [row[1] for row in con.execute(f"PRAGMA table_info({TABLE})")
+                        if row[1] != "row_id"]
+        options = {}
+        for col, option in con.execute(f"SELECT col, option FROM {OPTIONS_TABLE} ORDER BY col, bit"):
+            options.setdefault(col, []).append(option)
+        self.schema = json.loads(con.execute(
+            f"SELECT value FROM {META_TABLE} WHERE key = 'schema'").fetchone()[0])
+        self.layout = dashboard_layout(self.columns, options)
+        self.filter_columns = self.layout["filter_columns"]
+        self.chart_columns = self.layout["chart_columns"]
+        apps_col = self.layout["apps_col"]
+        self.multi = {apps_col} if apps_col else set()
+        self.ranges = set(self.layout["range_columns"])
+        self.time_col = self.layout["time_col"]
+        if self.time_col:
+            self.ranges.add(self.time_col)
+        self._values = {}
+        if apps_col:
+            self._values[apps_col] = self.layout["apps_options"] or [row[0] for row in con.execute(
+                f"SELECT option FROM {CHOICES_TABLE} WHERE col = ? ORDER BY option", (apps_col,))]
+        self._results = LRUCache(max_entries=QUERY_CACHE_ENTRIES)
+        # Keyword search goes through the text index stored with the rows
+        self.has_text = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                    (TEXT_POSTINGS_TABLE,)).fetchone() is not None
+        # Trends come from the rollups next to the database
+        self.rollup_file = os.path.join(os.path.dirname(os.path.abspath(path)), ROLLUP_FILE)
+
+    def _connection(self):
+        # One read-only connection per thread (Streamlit runs sessions on threads)
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+        return con
+
+    def _query(self, sql, params=()):
+        return self._results.get((sql, tuple(params)),
+                                 lambda: self._connection().execute(sql, params).fetchall())
+
+    def trend(self, metric, period, first=None, last=None):
+        rollups = load_rollups(self.rollup_file)
+        return None if rollups is None else trend(rollups, metric, period, first, last)
+
+    def values(self, col):
+        """Distinct values (or options) of a filter column, in order of first appearance;
+        [lowest, highest] for a range column"""
+        if col in self.ranges:
+            # Ends of the column's index
+            lo, hi = self._query(f"SELECT MIN({_quote(col)}), MAX({_quote(col)}) FROM {TABLE}")[0]
+            if lo is not None and col == self.time_col:
+                return [lo[:10], hi[:10]]
+            return [] if lo is None else [lo, hi]
+        if col not in self._values:
+            self._values[col] = [value for value, in self._query(
+                f"SELECT {_quote(col)} FROM {TABLE} WHERE {_quote(col)} IS NOT NULL "
+                f"GROUP BY {_quote(col)} ORDER BY MIN(row_id)")]
+        return self._values[col]
+
+    def _where(self, selection, *not_null):
+        clauses, params = [], []
+        for col, selected in selection.items():
+            selected = [_plain(v) for v in selected]
+            marks = ", ".join("?" * len(selected))
+            if col == SEARCH_KEY:
+                for query in selected:
+                    clause, more = self._search(query)
+                    if clause:
+                        clauses.append(clause)
+                        params += more
+            elif col == self.time_col:
+                # Index range scan over "YYYY-MM-DD HH:MM:SS" text, up to the day after the last
+                clauses.append(f"{_quote(col)} >= ? AND {_quote(col)} < ?")
+                params += [selected[0], (pd.Timestamp(selected[1]) + pd.Timedelta(days=1)).date().isoformat()]
+            elif col in self.ranges:
+                # Index range scan
+                clauses.append(f"{_quote(col)} BETWEEN ? AND ?")
+                params += selected
+            elif col in self.multi:
+                clauses.append(f"row_id IN (SELECT row_id FROM {ANSWERS_TABLE} WHERE choice_id IN "
+                               f"(SELECT choice_id FROM {CHOICES_TABLE} WHERE col = ? AND option IN ({marks})))")
+                params += [col, *selected]
+            elif set(selected) >= set(self.values(col)):
+                clauses.append(f"{_quote(col)} IS NOT NULL")
+            else:
+                clauses.append(f"{_quote(col)} IN ({marks})")
+                params += selected
+        clauses += [f"{_quote(col)} IS NOT NULL" for col in not_null]
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _search(self, query):
+        """WHERE clause matching responses whose open-text answers contain query's terms"""
+        terms = query_terms(query)
+        if not terms:
+            return None, []
+        clauses, params = [], []
+        for col in self.layout["text_columns"] if self.has_text else []:
+            # The answers posted under every term, as a subquery (parameters grow with the terms only)
+            ids = " INTERSECT ".join([f"SELECT answer_id FROM {TEXT_POSTINGS_TABLE} WHERE col = ? AND term = ?"]
+                                     * len(terms))
+            clauses.append(f"{_quote(col)} IN (SELECT answer FROM {TEXT_ANSWERS_TABLE} "
+                           f"WHERE col = ? AND answer_id IN ({ids}))")
+            params += [col] + [value for term in terms for value in (col, term)]
+        return "(" + (" OR ".join(clauses) or "0") + ")", params
+
+    def total(self, selection):
+        where, params = self._where(selection)
+        return self._query(f"SELECT COUNT(*) FROM {TABLE}{where}", params)[0][0]
+
+    def counts(self, dim, selection):
+        """Like df_filtered[dim].value_counts(): respondents per value, most common first"""
+        where, params = self._where(selection, dim)
+        rows = self._query(f"SELECT {_quote(dim)}, COUNT(*) FROM {TABLE}{where} "
+                           f"GROUP BY {_quote(dim)} ORDER BY COUNT(*) DESC, MIN(row_id)", params)
+        return pd.Series([n for _, n in rows], index=pd.Index([v for v, _ in rows], name=dim),
+                         name="count", dtype="int64")
+
+    def crosstab(self, dim, by, selection):
+        """Long-form counts of (dim, by) pairs"""
+        where, params = self._where(selection, dim, by)
+        rows = self._query(f"SELECT {_quote(dim)}, {_quote(by)}, COUNT(*) FROM {TABLE}{where} "
+                           f"GROUP BY {_quote(dim)}, {_quote(by)} ORDER BY MIN(row_id)", params)
+        return pd.DataFrame(rows, columns=[dim, by, "count"])
+
+    def prefetch(self, queries):
+        """Nothing to batch; each query is one SQL statement"""
+
+    def export(self, fmt, selection):
+        """CSV/XLSX bytes of every column for the matching respondents (cached)"""
+        where, params = self._where(selection)
+
+        def chunks():
+            for df in pd.read_sql(f"SELECT * FROM {TABLE}{where} ORDER BY row_id", self._connection(),
+                                  params=params, chunksize=EXPORT_CHUNK_ROWS):
+                df = apply_schema(df.drop(columns="row_id"), self.schema)
+                if self.time_col:
+                    # Stored as text; exported as datetimes, like the in-memory engine's
+                    df[self.time_col] = pd.to_datetime(df[self.time_col], errors="coerce")
+                yield df
+
+        return cached_export((self.version, selection_signature(selection)), fmt, self.columns, chunks)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def load_sqlite_engine(path=CLEANED_SQLITE):
+    """The engine over the SQLite copy, reopened whenever the database file changes"""
+    path = os.path.abspath(path)
+    signature = file_signature(path)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None or engine.version != signature:
+            engine = _engines[path] = SqliteEngine(path)
+    return engine
@@ -0,0 +1,130 @@
+# survey_synth.py
+# Deterministic synthetic wellbeing survey exports (same 26 columns as the real form)
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+FREQUENCY = ["Never", "Rarely", "Sometimes", "Weekly", "2-3x/week", "Daily", "Always"]
+LIKERT = ["Strongly disagree", "Disagree", "Neutral", "Agree", "Strongly agree"]
+APPS = ["Calm", "Daylio", "Headspace", "Insight Timer", "Jour", "MindDoc", "MindShift", "Moodpath",
+        "None", "Reflectly", "Replika", "Sanvello", "Stoic", "Wysa", "Youper"]
+EMOTIONS = ["Anger", "Anxiety", "Calm", "Excited", "Frustrated", "Grateful", "Hopeful", "Joy",
+            "Lonely", "Overwhelmed", "Peaceful", "Sadness", "Stressed", "Tired"]
+
+# Column -> answer pool for the single-choice questions, in form order
+CHOICES = {
+    "I am 18+ and I consent to anonymous data collection for academic purposes only.": ["Agree"],
+    "Country/Region": ["India", "Brazil", "Japan", "France", "Australia", "UK", "USA", "Germany",
+                       "Canada", "Mexico"],
+    "Primary role": ["Healthcare Worker", "Freelancer", "Teacher", "Working Professional", "Student",
+                     "Other", "Researcher"],
+    "Gender (optional)": ["Non-binary", "Female", "Male", "Prefer not to say"],
+    "How often do you journal?": FREQUENCY,
+    "How often do you chat with an AI companion for support?": FREQUENCY,
+    "Typical journaling session length (minutes)": ["0", "1-5", "6-10", "11-15", "16-20", "21-30", "30+"],
+    "How often do you journal late at night (after 11pm)?": FREQUENCY,
+    "Average sleep hours per night (past 2 weeks)": ["4 hours", "5 hours", "6 hours", "7 hours",
+                                                     "8 hour sleep", "9 hours", "10 hours", "10+ hours"],
+    "Average number of meetings/classes per day (past 2 weeks)": ["0", "1-2", "3-4", "5-6", "7-8", "9+"],
+    "How many deadlines/exams in the next 7 days?": ["0", "1", "2", "3", "4", "5", "6+"],
+    "In the last 2 weeks, how often did you feel overwhelmed?": FREQUENCY,
+    "In the last 2 weeks, how often did you feel things were going your way? (reverse-scored)": FREQUENCY,
+    "In the last 2 weeks, how often did you feel confident about handling personal problems? (reverse-scored)": FREQUENCY,
+    "In the last 2 weeks, how often did you feel difficulties were piling up too high?": FREQUENCY,
+    "Overall mood today": ["Negative", "Positive", "Neutral"],
+    "I am concerned about privacy of my journals.": LIKERT,
+    "I prefer on-device processing even if features are limited.": LIKERT,
+    "I am okay with personalized nudges if they help my wellbeing.": LIKERT,
+    "I am willing to share anonymized analytics for research.": LIKERT,
+    "What would you want from a wellbeing companion? (open text)": [
+        "Offline functionality", "Voice input", "Journaling prompts", "Professional support integration",
+        "Better privacy controls", "More personalization", "Better UI/UX", "Mood tracking",
+        "Integration with other apps", "Progress tracking", "Better AI responses", "Community support"],
+    "Any concerns about such apps? (open text)": [
+        "Lack of human connection", "Cost", "AI accuracy", "Privacy concerns", "Technical issues",
+        "Stigma around mental health apps", "Data security", "Addiction to apps", "Other",
+        "Over-reliance on AI"],
+}
+
+APPS_COL = "Which wellness/mental health apps have you used in the last 6 months? (select all that apply)"
+EMOTIONS_COL = "Which emotions did you often experience in the last week? (select all that apply)"
+
+# Raw export column order: the two multi-selects and Age sit between the choice questions
+_CHOICE_COLS = list(CHOICES)
+COLUMNS = ["Timestamp", *_CHOICE_COLS[:3], "Age (years)", "Gender (optional)", APPS_COL,
+           *_CHOICE_COLS[4:16], EMOTIONS_COL, *_CHOICE_COLS[16:]]
+
+# Share of blank answers per column, as seen in the real export
+MISSING = {
+    APPS_COL: 0.006,
+    "Any concerns about such apps? (open text)": 0.11,
+}
+
+START = pd.Timestamp("2025-08-21 00:00:00")
+
+
+def _subset_table(options, rng):
+    """Comma-joined answer for every subset bitmask, each in its own shuffled order"""
+    table = np.empty(1 << len(options), dtype=object)
+    for mask in range(len(table)):
+        chosen = [opt for i, opt in enumerate(options) if mask >> i & 1]
+        rng.shuffle(chosen)
+        table[mask] = ", ".join(chosen)
+    return table
+
+
+def _multi_select(rng, rows, options, low, high, table):
+    """Random subsets of low..high options per row, looked up as pre-joined strings"""
+    k = rng.integers(low, high + 1, size=rows)
+    order = np.argsort(rng.random((rows, len(options))), axis=1)
+    picked = np.arange(len(options)) < k[:, None]
+    bits = np.zeros(rows, dtype=np.int64)
+    for j in range(len(options)):
+        bits |= np.where(picked[:, j], 1 << order[:, j], 0)
+    return table[bits]
+
+
+def generate(rows, seed=0, start_row=0, tables=None):
+    """One DataFrame of synthetic raw survey rows (deterministic in seed and start_row)"""
+    rng = np.random.default_rng([seed, start_row])
+    if tables is None:
+        tables = survey_tables(seed)
+    data = {}
+    # Responses arrive in time order, about one every 13 seconds
+    seconds = (start_row + np.arange(rows)) * 13 + rng.integers(0, 13, size=rows)
+    data["Timestamp"] = (START + pd.to_timedelta(seconds, unit="s")).strftime("%m/%d/%Y %H:%M:%S")
+    for col, pool in CHOICES.items():
+        data[col] = np.asarray(pool, dtype=object)[rng.integers(0, len(pool), size=rows)]
+    data["Age (years)"] = rng.integers(18, 65, size=rows)
+    data[APPS_COL] = _multi_select(rng, rows, APPS, 1, len(APPS), tables[APPS_COL])
+    data[EMOTIONS_COL] = _multi_select(rng, rows, EMOTIONS, 2, 5, tables[EMOTIONS_COL])
+    df = pd.DataFrame(data, columns=COLUMNS)
+    for col, rate in MISSING.items():
+        df.loc[rng.random(rows) < rate, col] = np.nan
+    return df
+
+
+def survey_tables(seed=0):
+    rng = np.random.default_rng([seed, 1 << 40])
+    return {APPS_COL: _subset_table(APPS, rng), EMOTIONS_COL: _subset_table(EMOTIONS, rng)}
+
+
+def write_survey(path, rows, seed=0, chunk_rows=200_000):
+    """Write rows synthetic responses to path as CSV, a chunk at a time"""
+    tables = survey_tables(seed)
+    for start in range(0, rows, chunk_rows):
+        chunk = generate(min(chunk_rows, rows - start), seed, start, tables)
+        chunk.to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic wellbeing survey export.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("--output", default="wellbeing_survey_res_synthetic.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_survey(args.output, args.rows, args.seed)
+    print("✅ Wrote", args.rows, "responses to", args.output)
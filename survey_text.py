@@ -0,0 +1,312 @@
+# survey_text.py
+# Inverted index and term counts over the open-text answers
+#
+# Answers repeat a lot, so the index is kept over distinct answers: each is
+# tokenized once, terms post to answer ids, and a response is found through
+# its answer's id. Adding a batch only tokenizes answers not seen before.
+# The cleaner keeps the index next to the cleaned data (TEXT_INDEX_FILE, and
+# in its SQLite copy) as tables it folds every batch it writes into, and
+# readers load it whole.
+
+import os
+import re
+import sqlite3
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+TEXT_COLUMNS = [
+    "What would you want from a wellbeing companion? (open text)",
+    "Any concerns about such apps? (open text)",
+]
+TEXT_INDEX_FILE = "wellbeing_survey_res_Cleaned_text.sqlite"
+# Tables of a stored index
+ANSWERS_TABLE = "text_answers"      # (col, answer_id, answer, responses)
+TERMS_TABLE = "text_terms"          # (col, term, responses, occurrences)
+SURFACES_TABLE = "text_surfaces"    # (col, term, surface, occurrences)
+POSTINGS_TABLE = "text_postings"    # (col, term, answer_id)
+# Selection key of a keyword search over every open-text column
+SEARCH_KEY = "Open-text answers"
+
+# Terms are single words and runs of up to this many words
+MAX_NGRAM = 2
+STOPWORDS = frozenset("""
+a about all also am an and any are as at be been but by can could do does for from get
+had has have i if in into is it its just me more my no not of on or our so some such than
+that the their them then there these they this to too us very was we were what when which
+who will with would you your
+""".split())
+
+# Endings of words that end in "s" without being plurals (stress, focus, anxious, analysis)
+NOT_PLURAL = ("ss", "us", "is")
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PHRASE = re.compile(r'"([^"]*)"')
+
+
+def singular(word):
+    """word without a simple plural "s" (apps -> app)"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith(NOT_PLURAL):
+        return word[:-1]
+    return word
+
+
+def surface_words(text):
+    """Words of text as written, lower-cased with accents folded and stopwords dropped"""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return [word for word in _WORD.findall(text.lower().replace("'", ""))
+            if word not in STOPWORDS and len(word) >= 2]
+
+
+def words(text):
+    """Normalized words of text: surface_words() with simple plurals made singular"""
+    return [singular(word) for word in surface_words(text)]
+
+
+def ngrams(tokens, max_n=MAX_NGRAM):
+    """Every run of 1..max_n consecutive tokens, joined by spaces"""
+    return [" ".join(tokens[i:i + n]) for n in range(1, max_n + 1) for i in range(len(tokens) - n + 1)]
+
+
+def query_terms(query):
+    """Terms a response must contain to match query: each word, and each "quoted phrase" as a whole"""
+    terms = []
+    for phrase in _PHRASE.findall(query):
+        tokens = words(phrase)
+        if len(tokens) < MAX_NGRAM:
+            terms += tokens
+        else:
+            # Longer phrases match as overlapping n-grams
+            terms += [" ".join(tokens[i:i + MAX_NGRAM]) for i in range(len(tokens) - MAX_NGRAM + 1)]
+    terms += words(_PHRASE.sub(" ", query))
+    return list(dict.fromkeys(terms))
+
+
+class TextIndex:
+    """Postings (term -> answer ids) and term counts per open-text column.
+
+    For every column: the distinct answers in order of first appearance,
+    the responses giving each, and per term the responses containing it,
+    its total occurrences and those of each surface form it was written in
+    (tables show the most common one).
+    """
+
+    def __init__(self, state=None):
+        self.columns = (state or {}).get("columns", {})
+        self._ids = {col: {text: i for i, text in enumerate(data["answers"])}
+                     for col, data in self.columns.items()}
+        self._arrays = {}
+
+    def add(self, df, columns=TEXT_COLUMNS):
+        """Fold a batch of responses into the index"""
+        for col in columns:
+            if col not in df.columns:
+                continue
+            data = self.columns.setdefault(col, {"answers": [], "responses": [], "terms": {}, "postings": {},
+                                                 "surfaces": {}})
+            ids = self._ids.setdefault(col, {})
+            codes, uniques = pd.factorize(df[col].astype("object"))
+            batch = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            for text, n in zip(uniques, batch.tolist()):
+                text = str(text)
+                answer = ids.get(text)
+                surfaces = ngrams(surface_words(text))
+                grams = [" ".join(map(singular, surface.split(" "))) for surface in surfaces]
+                if answer is None:
+                    answer = ids[text] = len(data["answers"])
+                    data["answers"].append(text)
+                    data["responses"].append(0)
+                    for term in dict.fromkeys(grams):
+                        data["postings"].setdefault(term, []).append(answer)
+                data["responses"][answer] += n
+                for term in dict.fromkeys(grams):
+                    stats = data["terms"].setdefault(term, [0, 0])
+                    stats[0] += n
+                    stats[1] += n * grams.count(term)
+                for term, surface in zip(grams, surfaces):
+                    forms = data["surfaces"].setdefault(term, {})
+                    forms[surface] = forms.get(surface, 0) + n
+            self._arrays.pop(col, None)
+        return self
+
+    def top_terms(self, col, n=None, min_words=1):
+        """Responses per term (most common first), like value_counts() over the terms,
+        each labeled with its most common surface form"""
+        terms = self.columns.get(col, {}).get("terms", {})
+        table = pd.Series({self.surface(col, term): stats[0] for term, stats in terms.items()
+                           if term.count(" ") + 1 >= min_words}, dtype="int64")
+        table.index.name = col
+        table = table.rename("count").sort_values(ascending=False, kind="stable")
+        return table.head(n) if n else table
+
+    def surface(self, col, term):
+        """The form term was most often written in (the first seen among equals)"""
+        forms = self.columns.get(col, {}).get("surfaces", {}).get(term)
+        return max(forms, key=forms.get) if forms else term
+
+    def occurrences(self, col, term):
+        return self.columns.get(col, {}).get("terms", {}).get(term, [0, 0])[1]
+
+    def _postings(self, col):
+        if col not in self._arrays:
+            self._arrays[col] = {term: np.asarray(ids, dtype=np.int64)
+                                 for term, ids in self.columns[col]["postings"].items()}
+        return self._arrays[col]
+
+    def search(self, col, query):
+        """Ids of the answers in col that contain every term of query"""
+        terms = query_terms(query)
+        if col not in self.columns or not terms:
+            return np.array([], dtype=np.int64)
+        postings = self._postings(col)
+        found = None
+        for term in sorted(terms, key=lambda t: len(postings.get(t, ()))):
+            ids = postings.get(term)
+            if ids is None:
+                return np.array([], dtype=np.int64)
+            found = ids if found is None else np.intersect1d(found, ids, assume_unique=True)
+            if not len(found):
+                break
+        return found
+
+    def answers(self, col, ids):
+        return [self.columns[col]["answers"][i] for i in ids]
+
+    def row_codes(self, col, series):
+        """Answer id of every response in series (-1 where blank or not indexed)"""
+        answers = pd.Index(self.columns.get(col, {}).get("answers", []))
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            ids = answers.get_indexer(series.cat.categories.astype(str))
+            return np.append(ids, -1)[series.cat.codes.to_numpy()]
+        return answers.get_indexer(series.astype("object").where(series.notna(), None))
+
+    def match(self, codes, query):
+        """Boolean mask of the responses whose answer in any column contains every term of query
+
+        codes: {column: row_codes(...)}, all over the same responses. A query
+        without terms (blank, or only stopwords) matches everyone.
+        """
+        if not query_terms(query):
+            return np.ones(len(next(iter(codes.values()))), dtype=bool)
+        mask = None
+        for col, col_codes in codes.items():
+            hit = np.zeros(len(self.columns.get(col, {}).get("answers", [])) + 1, dtype=bool)
+            hit[self.search(col, query)] = True
+            found = hit[col_codes]
+            mask = found if mask is None else mask | found
+        return mask
+
+
+# ---------------------------
+# Stored index
+# ---------------------------
+def _create_tables(con):
+    con.execute(f"CREATE TABLE IF NOT EXISTS {ANSWERS_TABLE} (col TEXT, answer_id INTEGER, answer TEXT, "
+                "responses INTEGER, PRIMARY KEY (col, answer_id), UNIQUE (col, answer))")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {TERMS_TABLE} (col TEXT, term TEXT, responses INTEGER, "
+                "occurrences INTEGER, UNIQUE (col, term))")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {SURFACES_TABLE} (col TEXT, term TEXT, surface TEXT, "
+                "occurrences INTEGER, UNIQUE (col, term, surface))")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {POSTINGS_TABLE} (col TEXT, term TEXT, answer_id INTEGER, "
+                "PRIMARY KEY (col, term, answer_id)) WITHOUT ROWID")
+
+
+def store_text_index(con, index, append=False):
+    """Fold index (over one batch of responses) into con's index tables; they start over unless append.
+
+    Answers already stored keep their ids and only gain responses; new
+    answers take the next ids and post their terms. A batch costs its own
+    answers and terms, not the stored index. Runs in the caller's transaction.
+    """
+    _create_tables(con)
+    if not append:
+        for table in (ANSWERS_TABLE, TERMS_TABLE, SURFACES_TABLE, POSTINGS_TABLE):
+            con.execute(f"DELETE FROM {table}")
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS batch_answers (local INTEGER PRIMARY KEY, answer TEXT)")
+    for col, data in index.columns.items():
+        con.execute("DELETE FROM temp.batch_answers")
+        con.executemany("INSERT INTO temp.batch_answers VALUES (?, ?)", enumerate(data["answers"]))
+        ids = np.full(len(data["answers"]), -1, dtype=np.int64)
+        for local, answer_id in con.execute(f"SELECT b.local, a.answer_id FROM temp.batch_answers b "
+                                            f"JOIN {ANSWERS_TABLE} a ON a.col = ? AND a.answer = b.answer", (col,)):
+            ids[local] = answer_id
+        new = ids < 0
+        start = con.execute(f"SELECT COALESCE(MAX(answer_id) + 1, 0) FROM {ANSWERS_TABLE} WHERE col = ?",
+                            (col,)).fetchone()[0]
+        ids[new] = start + np.arange(new.sum())
+        con.executemany(f"UPDATE {ANSWERS_TABLE} SET responses = responses + ? WHERE col = ? AND answer_id = ?",
+                        [(n, col, int(i)) for i, n, is_new in zip(ids, data["responses"], new) if not is_new])
+        con.executemany(f"INSERT INTO {ANSWERS_TABLE} VALUES (?, ?, ?, ?)",
+                        [(col, int(i), text, n)
+                         for i, text, n, is_new in zip(ids, data["answers"], data["responses"], new) if is_new])
+        con.executemany(f"INSERT INTO {TERMS_TABLE} VALUES (?, ?, ?, ?) ON CONFLICT (col, term) DO UPDATE SET "
+                        "responses = responses + excluded.responses, "
+                        "occurrences = occurrences + excluded.occurrences",
+                        [(col, term, r, o) for term, (r, o) in data["terms"].items()])
+        con.executemany(f"INSERT INTO {SURFACES_TABLE} VALUES (?, ?, ?, ?) ON CONFLICT (col, term, surface) "
+                        "DO UPDATE SET occurrences = occurrences + excluded.occurrences",
+                        [(col, term, surface, n) for term, forms in data["surfaces"].items()
+                         for surface, n in forms.items()])
+        con.executemany(f"INSERT INTO {POSTINGS_TABLE} VALUES (?, ?, ?)",
+                        [(col, term, int(ids[a])) for term, answers in data["postings"].items()
+                         for a in answers if new[a]])
+
+
+def load_text_index(con):
+    """TextIndex over con's index tables (None if it has none)"""
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                   (ANSWERS_TABLE,)).fetchone() is None:
+        return None
+    # One scan per table, in insertion (first appearance) order
+    columns = {}
+    for col, answer, n in con.execute(f"SELECT col, answer, responses FROM {ANSWERS_TABLE} ORDER BY rowid"):
+        data = columns.get(col)
+        if data is None:
+            data = columns[col] = {"answers": [], "responses": [], "terms": {}, "postings": {}, "surfaces": {}}
+        data["answers"].append(answer)
+        data["responses"].append(n)
+    terms = {col: data["terms"] for col, data in columns.items()}
+    for col, term, r, o in con.execute(f"SELECT col, term, responses, occurrences FROM {TERMS_TABLE} "
+                                       "ORDER BY rowid"):
+        terms[col][term] = [r, o]
+    surfaces = {col: data["surfaces"] for col, data in columns.items()}
+    for col, term, surface, n in con.execute(f"SELECT col, term, surface, occurrences FROM {SURFACES_TABLE} "
+                                             "ORDER BY rowid"):
+        forms = surfaces[col].get(term)
+        if forms is None:
+            forms = surfaces[col][term] = {}
+        forms[surface] = n
+    postings = {col: data["postings"] for col, data in columns.items()}
+    for col, term, answer_id in con.execute(f"SELECT col, term, answer_id FROM {POSTINGS_TABLE}"):
+        ids = postings[col].get(term)
+        if ids is None:
+            ids = postings[col][term] = []
+        ids.append(answer_id)
+    return TextIndex({"columns": columns})
+
+
+def read_text_index(path=TEXT_INDEX_FILE):
+    """The index the cleaner wrote (None if there is none)"""
+    if not os.path.exists(path):
+        return None
+    con = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        return load_text_index(con)
+    finally:
+        con.close()
+
+
+def update_text_index(df, append=False, path=TEXT_INDEX_FILE, index=None):
+    """Fold a batch of cleaned responses into the index file, or start it over unless append
+
+    index: the batch's TextIndex().add(df), when it was built elsewhere (e.g. in a worker process)
+    """
+    if index is None:
+        index = TextIndex().add(df)
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            store_text_index(con, index, append)
+    finally:
+        con.close()
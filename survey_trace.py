@@ -0,0 +1,167 @@
+# survey_trace.py
+# Opt-in stage timers and memory peaks, written as JSON lines
+#
+# Off by default. Enable with the SURVEY_TRACE environment variable (the
+# JSON lines file to append to, or "1" for survey_trace.jsonl) or the
+# scripts' --trace option; SURVEY_TRACE_MEMORY=1 / --trace-memory adds
+# tracemalloc peaks. While disabled, stage() hands back one shared no-op
+# context manager, so instrumented code pays a couple of attribute lookups.
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, so records carry tracemalloc peaks only
+    resource = None
+
+TRACE_ENV = "SURVEY_TRACE"
+TRACE_MEMORY_ENV = "SURVEY_TRACE_MEMORY"
+TRACE_FILE = "survey_trace.jsonl"
+
+RUN_ID = f"{os.getpid()}-{int(time.time())}"
+
+_path = None
+_memory = False
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def configure(path=None, memory=False):
+    """Start (path set) or stop (path None) writing stage records to path"""
+    global _path, _memory
+    _path = TRACE_FILE if path in ("1", "true", "yes") else (path or None)
+    _memory = bool(memory) and _path is not None
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def enabled():
+    return _path is not None or getattr(_local, "records", None) is not None
+
+
+def rss_mb():
+    """Current resident set size (peak so far where /proc is unavailable, None on Windows)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class _Stage:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        if _memory:
+            # Nested stages reset the tracemalloc peak, so hand the peak seen
+            # so far to the enclosing stage first
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        stack = _stack()
+        name = "/".join(s.name for s in stack)
+        stack.pop()
+        record = {"stage": name, "seconds": round(seconds, 6), **self.fields}
+        if _memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            record["peak_mb"] = round(peak / 2**20, 2)
+        _emit(record)
+        return False
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def stage(name, **fields):
+    """Context manager timing one stage; nested stages are named "outer/inner".
+
+    Extra keyword fields (row counts, file names...) go into the record.
+    """
+    if _path is None and getattr(_local, "records", None) is None:
+        return _NO_STAGE
+    return _Stage(name, fields)
+
+
+def annotate(**fields):
+    """Add fields to the record of the innermost running stage"""
+    stack = getattr(_local, "stack", None)
+    if stack and enabled():
+        stack[-1].fields.update(fields)
+
+
+def record(name, seconds, **fields):
+    """Record a duration measured elsewhere (e.g. summed over chunks) under the current stage"""
+    if not enabled():
+        return
+    prefix = "/".join(s.name for s in _stack())
+    _emit({"stage": f"{prefix}/{name}" if prefix else name, "seconds": round(seconds, 6), **fields})
+
+
+def _emit(record):
+    for key, mb in (("rss_mb", rss_mb()), ("max_rss_mb", max_rss_mb())):
+        if mb is not None:
+            record[key] = round(mb, 1)
+    records = getattr(_local, "records", None)
+    if records is not None:
+        records.append(record)
+    if _path is not None:
+        line = json.dumps({"run": RUN_ID, "script": os.path.basename(sys.argv[0]), **record},
+                          default=str)
+        with _write_lock, open(_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def start_collecting():
+    """Also keep this thread's records in a list, whether or not a file is configured"""
+    _local.records = []
+    _local.stack = []
+    return _local.records
+
+
+def stop_collecting():
+    records = getattr(_local, "records", None)
+    _local.records = None
+    return records or []
+
+
+configure(os.environ.get(TRACE_ENV), os.environ.get(TRACE_MEMORY_ENV) in ("1", "true", "yes"))
@@ -0,0 +1,7 @@
+# conftest.py
+# The modules live at the repository root, next to the scripts that use them
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,153 @@
+# test_cleaning.py
+# The cleaner's modes (whole file, chunked, incremental, multi-file) must agree
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import wellbeing_survey_res_Cleaning as cleaning
+from survey_data import mask_column, read_options
+from survey_text import TEXT_COLUMNS
+
+SMALL_CSV = os.path.join(os.path.dirname(__file__), "data", "wellbeing_survey_small.csv")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch directory holding the small raw export; the cleaner writes its outputs here"""
+    shutil.copy(SMALL_CSV, tmp_path / cleaning.RAW_FILE)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def raw():
+    return cleaning.read_raw(SMALL_CSV)
+
+
+def cleaned_bytes():
+    with open(cleaning.OUTPUT_FILE, "rb") as f:
+        return f.read()
+
+
+def append_raw_rows(source, start):
+    """Append the data lines of source from row start on to the raw file"""
+    with open(source, "rb") as f:
+        lines = f.readlines()[1 + start:]
+    with open(cleaning.RAW_FILE, "ab") as f:
+        f.writelines(lines)
+    return len(lines)
+
+
+def cleaned_frame():
+    """The cleaned CSV with bitmasks decoded to option sets (bit order depends on the run)"""
+    df = pd.read_csv(cleaning.OUTPUT_FILE)
+    options = read_options()
+    for col, vocabulary in options.items():
+        mask = mask_column(col)
+        df[mask] = [frozenset(o for i, o in enumerate(vocabulary) if int(m) >> i & 1) for m in df[mask]]
+    return df
+
+
+def write_head(rows):
+    """Make the raw file the header and first rows of the small export"""
+    with open(SMALL_CSV, "rb") as f:
+        lines = f.readlines()
+    with open(cleaning.RAW_FILE, "wb") as f:
+        f.writelines(lines[:1 + rows])
+
+
+def test_profile_stays_bounded_as_chunks_are_added(raw):
+    def counted(profile):
+        return {col: len(info.get("counts") or {}) + len(info.get("options", {}))
+                for col, info in profile["columns"].items()}
+
+    first = cleaning.profile_frame(raw)
+    merged = first
+    times = pd.to_datetime(raw["Timestamp"], format=first["timestamp_format"])
+    for day in range(1, 10):
+        # New timestamps and open-text answers in every chunk
+        chunk = raw.assign(Timestamp=(times + pd.Timedelta(days=day)).dt.strftime(first["timestamp_format"]))
+        for col in TEXT_COLUMNS:
+            chunk[col] = chunk[col] + f" (batch {day})"
+        merged = cleaning.merge_profiles(merged, cleaning.profile_frame(chunk))
+    assert merged["rows"] == 10 * len(raw)
+    assert counted(merged) == counted(first)
+    assert merged["columns"]["Timestamp"] == {"missing": 0}
+
+
+def test_profile_keeps_only_the_range_of_many_distinct_numbers(monkeypatch):
+    monkeypatch.setattr(cleaning, "PROFILE_MAX_VALUES", 3)
+    a = cleaning.profile_frame(pd.DataFrame({"n": ["1", "2", "3"]}))
+    b = cleaning.profile_frame(pd.DataFrame({"n": ["4", None]}))
+    merged = cleaning.merge_profiles(a, b)
+    assert merged["columns"]["n"] == {"missing": 1, "counts": None,
+                                      "numbers": {"min": 1.0, "max": 4.0, "integral": True}}
+    assert merged == cleaning.profile_frame(pd.DataFrame({"n": ["1", "2", "3", "4", None]}))
+
+
+def test_chunked_output_matches_whole_file(workdir):
+    cleaning.main(cleaning.RAW_FILE)
+    whole = cleaned_bytes()
+    cleaning.main(cleaning.RAW_FILE, chunksize=7)
+    assert cleaned_bytes() == whole
+
+
+def test_incremental_run_profiles_only_new_rows(workdir, monkeypatch):
+    write_head(30)
+    cleaning.clean_incremental()
+    profiled = []
+    profile_frame = cleaning.profile_frame
+    monkeypatch.setattr(cleaning, "profile_frame", lambda df: profiled.append(len(df)) or profile_frame(df))
+    added = append_raw_rows(SMALL_CSV, 30)
+    cleaning.clean_incremental()
+    assert profiled == [added]
+
+
+def test_incremental_run_matches_full_reclean(workdir, capsys):
+    write_head(30)
+    cleaning.clean_incremental()
+    append_raw_rows(SMALL_CSV, 30)
+    cleaning.clean_incremental()
+    assert "Appended" in capsys.readouterr().out
+    incremental = cleaned_frame()
+    cleaning.main(cleaning.RAW_FILE)
+    pd.testing.assert_frame_equal(incremental, cleaned_frame())
+
+
+def test_state_without_version_starts_a_full_run(workdir, capsys):
+    write_head(30)
+    cleaning.clean_incremental()
+    state = cleaning.load_state()
+    del state["version"]
+    cleaning.save_state(state)
+    append_raw_rows(SMALL_CSV, 30)
+    cleaning.clean_incremental()
+    assert "No usable incremental state" in capsys.readouterr().out
+
+
+def split_exports(directory, parts=3):
+    """Split the small export into parts files under directory, in order. The second part is
+    re-exported with day-first timestamps and the last one repeats the first part's first rows."""
+    raw = cleaning.read_raw(SMALL_CSV).astype(object)
+    os.makedirs(directory)
+    bounds = [len(raw) * i // parts for i in range(parts + 1)]
+    for i in range(parts):
+        part = raw.iloc[bounds[i]:bounds[i + 1]]
+        if i == 1:
+            times = pd.to_datetime(part["Timestamp"], format="%m/%d/%Y %H:%M:%S")
+            part = part.assign(Timestamp=times.dt.strftime("%d/%m/%Y %H:%M:%S"))
+        if i == parts - 1:
+            part = pd.concat([part, raw.iloc[:3]])
+        part.to_csv(os.path.join(directory, f"export_{i}.csv"), index=False)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_multi_file_output_matches_single_file(workdir, workers):
+    cleaning.main(cleaning.RAW_FILE)
+    single = cleaned_bytes()
+    split_exports("exports")
+    cleaning.main("exports", workers=workers)
+    assert cleaned_bytes() == single
@@ -0,0 +1,18 @@
+# test_survey_data.py
+
+import pandas as pd
+
+from survey_data import encode_options, split_options
+
+
+def test_split_options_skips_missing_answers():
+    answers = pd.Series(["A, b", None, "c; None", float("nan")])
+    tokens = split_options(answers)
+    assert tokens.tolist() == ["A", "B", "C", "None"]
+    assert tokens.index.tolist() == [0, 0, 2, 2]
+
+
+def test_missing_answer_encodes_as_no_options():
+    answers = pd.Series(["A, b", None])
+    masks = encode_options(split_options(answers), ["A", "B"], answers.index)
+    assert masks.tolist() == [0b11, 0]
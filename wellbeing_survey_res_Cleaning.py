@@ -1,110 +1,941 @@
 # week1_data_cleaning.py
 # Week 1: Data Cleaning & Setup for Wellbeing Survey Dataset
 
-import pandas as pd
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
 import re
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
 
-def main():
-    # ---------------------------
-    # Step 1: Load & Inspect Data
-    # ---------------------------
-    file_path = "wellbeing_survey_res.csv"   # ensure this CSV is in the same folder
-    df = pd.read_csv(file_path, encoding="utf-8")
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from survey_data import (CLEANED_PARQUET, MAX_OPTIONS, apply_schema, encode_options, mask_column,
+                         split_options, write_columnar, write_options, write_schema)
+from survey_metrics import (SCORE_MAX, STRESS_BANDS, STRESS_ITEMS, STRESS_LEVEL_COL, STRESS_SCORE_COL,
+                            add_stress_metrics, frequency_points)
+from survey_rollups import rollup, update_rollups
+from survey_sqlite import CLEANED_SQLITE, write_sqlite, write_sqlite_meta
+from survey_text import TEXT_COLUMNS, TextIndex, update_text_index
+from survey_trace import TRACE_FILE, configure as configure_trace, stage
+
+RAW_FILE = "wellbeing_survey_res.csv"   # ensure this CSV is in the same folder
+OUTPUT_FILE = "wellbeing_survey_res_Cleaned.csv"
+# Imputation state and raw-file watermark, used by --incremental runs
+STATE_FILE = "wellbeing_survey_res_Cleaning_state.json"
+# Layout of the state file; states of another version start a full run
+# (2: bounded column profiles instead of a counter of every answer)
+STATE_VERSION = 2
+
+MULTI_CHOICE_COLS = [
+    "Which wellness/mental health apps have you used in the last 6 months? (select all that apply)",
+    "Which emotions did you often experience in the last week? (select all that apply)"
+]
+
+LIKERT_MAP = {
+    "Strongly disagree": 1,
+    "Disagree": 2,
+    "Neutral": 3,
+    "Agree": 4,
+    "Strongly agree": 5
+}
+
+LIKERT_COLS = [
+    "I am concerned about privacy of my journals.",
+    "I prefer on-device processing even if features are limited.",
+    "I am okay with personalized nudges if they help my wellbeing.",
+    "I am willing to share anonymized analytics for research."
+]
+# Case- and space-insensitive lookup of LIKERT_MAP
+LIKERT_LOOKUP = {k.lower(): v for k, v in LIKERT_MAP.items()}
+
+AGE_COL = "Age (years)"
+SLEEP_COL = "Average sleep hours per night (past 2 weeks)"
+DEADLINES_COL = "How many deadlines/exams in the next 7 days?"
+# Text columns (other than open text) with at most this many distinct answers are stored as categories
+CATEGORY_MAX = 1000
+# Distinct answers a profile counts exactly per column; past this a column
+# keeps only the range of its numbers, so profiles stay bounded
+PROFILE_MAX_VALUES = 1000
+
+# Bytes before the watermark that must be unchanged for an append-only update
+WATERMARK_WINDOW = 64 * 1024
+# Peak frame size relative to the raw text chunk while a chunk is transformed
+# (typed copy, multi-choice lists, CSV/Parquet buffers)
+CHUNK_OVERHEAD = 4
+# Timestamps a format guess is scored on
+TIMESTAMP_SAMPLE = 10_000
+# Keys of the two 64-bit hashes that make up a row's 128-bit identity
+ROW_HASH_KEYS = ("wellbeing-survey", "dedup-respondent")
+
+
+def read_raw(source, chunksize=None):
+    """Read raw survey rows with every column as text; dtypes come from the plan.
+
+    With chunksize, returns an iterator of frames instead of one frame.
+    """
+    return pd.read_csv(source, dtype=str, encoding="utf-8", chunksize=chunksize)
+
+
+def chunksize_for(file_path, max_memory_mb, sample_rows=1000):
+    """Rows per chunk that keep a transformed chunk under max_memory_mb"""
+    sample = pd.read_csv(file_path, dtype=str, encoding="utf-8", nrows=sample_rows)
+    row_bytes = max(1, sample.memory_usage(deep=True).sum() / max(1, len(sample)))
+    return max(100, int(max_memory_mb * 1024 * 1024 / (row_bytes * CHUNK_OVERHEAD)))
+
+
+# ---------------------------
+# Column profiles & cleaning plan
+# ---------------------------
+def timestamp_format(values):
+    """Format that parses the most of the first TIMESTAMP_SAMPLE timestamps (text), month first on
+    a tie, or None if there are none"""
+    sample = values.dropna().iloc[:TIMESTAMP_SAMPLE]
+    if sample.empty:
+        return None
+    # Month- and day-first guesses from a few answers; a day past the 12th settles the order
+    with warnings.catch_warnings():
+        # pandas warns when a day-first guess can only be month-first
+        warnings.simplefilter("ignore", UserWarning)
+        candidates = [guess_datetime_format(value, dayfirst=dayfirst)
+                      for value in sample.drop_duplicates().iloc[:20] for dayfirst in (False, True)]
+    candidates = list(dict.fromkeys(fmt for fmt in candidates if fmt))
+    if not candidates:
+        return None
+    parsed = [pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum() for fmt in candidates]
+    return candidates[int(np.argmax(parsed))]
+
+
+def _number_range(values):
+    """{"min", "max", "integral"} of text values, or None unless every one is a number"""
+    numbers = [_as_number(v) for v in values]
+    if any(x is None for x in numbers):
+        return None
+    return {"min": min(numbers), "max": max(numbers), "integral": all(_is_int(v) for v in values)}
+
+
+def _merge_ranges(a, b):
+    if a is None or b is None:
+        return None
+    return {"min": min(a["min"], b["min"]), "max": max(a["max"], b["max"]),
+            "integral": a["integral"] and b["integral"]}
+
+
+def _counted(missing, counts):
+    """Column profile from exact value counts, or just their number range past PROFILE_MAX_VALUES"""
+    if len(counts) <= PROFILE_MAX_VALUES:
+        return {"missing": missing, "counts": counts}
+    return {"missing": missing, "counts": None, "numbers": _number_range(counts)}
+
+
+def _empty_column(col):
+    if col == "Timestamp" or col in TEXT_COLUMNS:
+        return {"missing": 0}
+    if col in MULTI_CHOICE_COLS:
+        return {"missing": 0, "options": {}}
+    return {"missing": 0, "counts": {}}
+
+
+def _add_counts(a, b):
+    counts = dict(a)
+    for value, n in b.items():
+        counts[value] = counts.get(value, 0) + n
+    return counts
+
+
+def profile_frame(df):
+    """Mergeable per-column summary of raw rows, bounded whatever the row count.
+
+    Every column keeps its missing count. Timestamps and open text (one
+    value per response) keep nothing else, multi-select columns count their
+    options, and other columns count their answers exactly (see _counted).
+    """
+    profile = {"rows": len(df), "timestamp_format": None, "columns": {}}
+    for col in df.columns:
+        info = _empty_column(col)
+        info["missing"] = int(df[col].isna().sum())
+        if "options" in info:
+            info["options"] = {k: int(v) for k, v in split_options(df[col]).value_counts().items()}
+        elif "counts" in info:
+            info = _counted(info["missing"], {str(k): int(v) for k, v in df[col].value_counts().items()})
+        profile["columns"][col] = info
+    if "Timestamp" in df.columns:
+        profile["timestamp_format"] = timestamp_format(df["Timestamp"])
+    return profile
+
+
+def merge_profiles(a, b):
+    """Combine the profiles of two row batches (a comes first in file order)"""
+    merged = {
+        "rows": a["rows"] + b["rows"],
+        "timestamp_format": a["timestamp_format"] or b["timestamp_format"],
+        "columns": {},
+    }
+    for col in list(a["columns"]) + [c for c in b["columns"] if c not in a["columns"]]:
+        left = a["columns"].get(col, _empty_column(col))
+        right = b["columns"].get(col, _empty_column(col))
+        missing = left["missing"] + right["missing"]
+        if "options" in left:
+            merged["columns"][col] = {"missing": missing,
+                                      "options": _add_counts(left["options"], right["options"])}
+        elif "counts" not in left:
+            merged["columns"][col] = {"missing": missing}
+        elif left["counts"] is not None and right["counts"] is not None:
+            merged["columns"][col] = _counted(missing, _add_counts(left["counts"], right["counts"]))
+        else:
+            # Past the exact counts; an empty side adds nothing to the range
+            ranges = [side["numbers"] if side["counts"] is None else _number_range(side["counts"])
+                      for side in (left, right) if side["counts"] != {}]
+            merged["columns"][col] = {"missing": missing, "counts": None,
+                                      "numbers": reduce(_merge_ranges, ranges)}
+    return merged
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
 
-    print("="*60)
-    print("Initial Shape:", df.shape)
-    print("Columns:", df.columns.tolist())
-    print("="*60)
+
+def _is_int(value):
+    try:
+        int(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _median(counts):
+    """Exact median of a numeric value counter"""
+    values = sorted((_as_number(k), n) for k, n in counts.items())
+    total = sum(n for _, n in values)
+    if total == 0:
+        return None
+    lo, hi = (total - 1) // 2, total // 2
+    seen, lo_val, hi_val = 0, None, None
+    for value, n in values:
+        if lo_val is None and seen + n > lo:
+            lo_val = value
+        if seen + n > hi:
+            hi_val = value
+            break
+        seen += n
+    return (lo_val + hi_val) / 2
+
+
+def _mode(counts):
+    """Most frequent value; ties go to the smallest, as Series.mode()[0] does"""
+    if not counts:
+        return None
+    best = max(counts.values())
+    return min(k for k, n in counts.items() if n == best)
+
+
+def _grown(vocabulary, values):
+    """vocabulary with the values it lacks appended in sorted order, so existing codes and bits keep
+    their positions"""
+    known = set(vocabulary)
+    return list(vocabulary) + sorted(v for v in set(values) if v not in known)
+
+
+def fit_plan(profile, previous=None):
+    """Derive column drops, dtypes and fill values from a (merged) profile
+
+    previous: the plan the rows cleaned so far used; its option vocabularies
+    and categories are only ever extended at the end.
+    """
+    n = profile["rows"]
+    threshold = 0.4 * n  # drop col if >40% missing
+    plan = {"columns": [], "dtypes": {}, "fill": {}, "likert_partial": [], "options": {},
+            "timestamp_format": profile["timestamp_format"]}
+    for col, info in profile["columns"].items():
+        if n - info["missing"] < n - threshold:
+            continue
+        plan["columns"].append(col)
+        keys = info.get("counts")
+        if keys is None:
+            # Timestamps, open text, multi-select answers and columns with too
+            # many distinct answers: no median or mode, so gaps stay missing
+            numbers = info.get("numbers")
+            integral = numbers and numbers["integral"] and info["missing"] == 0
+            plan["dtypes"][col] = ("int64" if integral else "float64") if numbers else "object"
+            plan["fill"][col] = None
+        elif all(_as_number(k) is not None for k in keys):
+            integral = info["missing"] == 0 and keys and all(_is_int(k) for k in keys)
+            plan["dtypes"][col] = "int64" if integral else "float64"
+            plan["fill"][col] = _median(keys)
+        else:
+            plan["dtypes"][col] = "object"
+            plan["fill"][col] = _mode(keys)
+        if col in LIKERT_COLS:
+            # Uncounted answers are too many to all be on the scale
+            off_scale = (n - info["missing"] if keys is None
+                         else sum(n for k, n in keys.items() if _likert(k) is None))
+            if off_scale:
+                plan["likert_partial"].append(col)
+                print(f"⚠️ {col}: {off_scale} answers off the Likert scale; stored as missing")
+        if col in MULTI_CHOICE_COLS:
+            known = previous["options"].get(col, []) if previous else []
+            options = _grown(known, info["options"])
+            if len(options) <= MAX_OPTIONS:
+                plan["options"][col] = options
+            else:
+                print(f"⚠️ {col}: {len(options)} options, too many for a bitmask; skipping it")
+    plan["schema"] = fit_schema(profile, plan, previous["schema"] if previous else None)
+    return plan
+
+
+def _likert(answer):
+    """Scale point of a Likert answer: the text in any case, or the number itself"""
+    point = LIKERT_LOOKUP.get(str(answer).strip().lower())
+    if point is None and _as_number(str(answer)) in LIKERT_MAP.values():
+        point = int(float(answer))
+    return point
+
+
+def _int_dtype(lo, hi, nullable=False):
+    """Smallest integer dtype holding lo..hi ("UInt8"-style when it must hold <NA>)"""
+    for name in ("uint8", "int8", "uint16", "int16", "uint32", "int32", "int64"):
+        info = np.iinfo(name)
+        if info.min <= lo and hi <= info.max:
+            break
+    if nullable:
+        return "U" + name[1:].capitalize() if name.startswith("u") else name.capitalize()
+    return name
+
+
+def _whole_numbers(values):
+    """values as ints, or None unless every one is a whole number"""
+    numbers = [_as_number(str(v)) for v in values]
+    if not numbers or any(x is None or x != int(x) for x in numbers):
+        return None
+    return [int(x) for x in numbers]
+
+
+def fit_schema(profile, plan, previous=None):
+    """Compact dtype per cleaned column: categories for enumerations, the
+    smallest integer type for Likert, age, sleep, counts and other
+    whole-number columns (nullable only where gaps can remain).
+
+    Columns left out (timestamps, multi-choice and open text, fractional
+    numbers) keep the dtype transform() gives them. Categories extend those
+    of the previous schema, if any.
+    """
+    previous = previous or {}
+    schema = {}
+    for col in plan["columns"]:
+        if col == "Timestamp" or col in MULTI_CHOICE_COLS or col in TEXT_COLUMNS:
+            continue
+        info = profile["columns"][col]
+        if info["counts"] is None:
+            # Too many distinct answers to count: whole numbers are sized by their range
+            numbers = info["numbers"]
+            if numbers and numbers["integral"] and col not in LIKERT_COLS:
+                lo, hi, gaps = int(numbers["min"]), int(numbers["max"]), info["missing"] > 0
+                if col == DEADLINES_COL and gaps:
+                    lo, gaps = min(lo, 0), False
+                schema[col] = {"dtype": _int_dtype(lo, hi, nullable=gaps)}
+            continue
+        keys = list(info["counts"])
+        fill = plan["fill"][col]
+        answers = keys + ([fill] if info["missing"] and fill is not None else [])
+        if col in LIKERT_COLS:
+            off_scale = any(_likert(a) is None for a in answers)
+            schema[col] = {"dtype": "Int8" if off_scale else "int8"}
+        elif col == SLEEP_COL:
+            hours = [re.search(r"\d+", str(a)) for a in answers]
+            known = [int(h.group()) for h in hours if h]
+            if known:
+                schema[col] = {"dtype": _int_dtype(min(known), max(known),
+                                                   nullable=len(known) < len(hours))}
+        elif col in (AGE_COL, DEADLINES_COL):
+            # Converted with to_numeric(); unparsable answers become NaN, or 0
+            # for deadlines
+            numeric = [a for a in answers if _as_number(str(a)) is not None]
+            numbers = _whole_numbers(numeric or [0])
+            gaps = len(numeric) < len(answers)
+            if numbers is not None:
+                if col == DEADLINES_COL and gaps:
+                    numbers, gaps = numbers + [0], False
+                schema[col] = {"dtype": _int_dtype(min(numbers), max(numbers), nullable=gaps)}
+        elif plan["dtypes"][col] == "object":
+            if len(keys) <= CATEGORY_MAX:
+                schema[col] = {"dtype": "category",
+                               "categories": _grown(previous.get(col, {}).get("categories", []), keys)}
+        else:
+            numbers = _whole_numbers(answers)
+            if numbers is not None:
+                schema[col] = {"dtype": _int_dtype(min(numbers), max(numbers))}
+    for col in plan["options"]:
+        schema[mask_column(col)] = {"dtype": "uint64"}
+    if all(col in plan["columns"] for col in STRESS_ITEMS):
+        # Derived columns; the score has gaps only where an item can be off the scale
+        off_scale = False
+        for col in STRESS_ITEMS:
+            info = profile["columns"][col]
+            answers = list(info["counts"]) if info["counts"] is not None else [None]
+            answers += [plan["fill"][col]] if info["missing"] else []
+            off_scale = off_scale or any(frequency_points(a) is None for a in answers)
+        schema[STRESS_SCORE_COL] = {"dtype": _int_dtype(0, SCORE_MAX, nullable=off_scale)}
+        schema[STRESS_LEVEL_COL] = {"dtype": "category", "categories": list(STRESS_BANDS)}
+    return schema
+
+
+def _extends(old, new):
+    """True when the list new is old with (possibly) values appended"""
+    return new[:len(old)] == old
+
+
+def _schema_extends(old, new):
+    """True when new only adds categories (at the end) to old's categorical columns"""
+    if list(old) != list(new):
+        return False
+    for col, spec in old.items():
+        if {**new[col], "categories": None} != {**spec, "categories": None} or not _extends(
+                spec.get("categories", []), new[col].get("categories", [])):
+            return False
+    return True
+
+
+def plans_compatible(old_plan, new_plan, old_profile):
+    """True when rows cleaned under old_plan would come out the same under new_plan.
+
+    Fill values only matter for columns that actually had gaps in the rows
+    already cleaned. Option vocabularies and categories may gain values at
+    the end (the new plan is then a widening of the old one); everything
+    else structural must match exactly.
+    """
+    for key in ("columns", "dtypes", "likert_partial", "timestamp_format"):
+        if old_plan.get(key) != new_plan.get(key):
+            return False
+    old_options, new_options = old_plan["options"], new_plan["options"]
+    if list(old_options) != list(new_options) or not all(
+            _extends(old_options[col], new_options[col]) for col in old_options):
+        return False
+    if not _schema_extends(old_plan.get("schema", {}), new_plan.get("schema", {})):
+        return False
+    for col in old_plan["columns"]:
+        if old_profile["columns"][col]["missing"] and old_plan["fill"][col] != new_plan["fill"][col]:
+            return False
+    return True
+
+
+def transform(df, plan):
+    """Clean raw (text) rows according to plan"""
+    df = df[plan["columns"]].copy()
 
     # ---------------------------
     # Step 2: Handle Missing Values
     # ---------------------------
-    print("\nMissing values before cleaning:\n", df.isnull().sum())
+    with stage("step2_missing_values", rows=len(df)):
+        for col in plan["columns"]:
+            if plan["dtypes"][col] != "object":
+                df[col] = df[col].astype(plan["dtypes"][col])
+            if plan["fill"][col] is not None:
+                df[col] = df[col].fillna(plan["fill"][col])
 
-    threshold = 0.4 * len(df)  # drop col if >40% missing
-    df = df.dropna(axis=1, thresh=len(df) - threshold)
+    # ---------------------------
+    # Step 3: Standardize Columns
+    # ---------------------------
+    with stage("step3_standardize"):
+        # Convert Age to numeric
+        if AGE_COL in df.columns:
+            df[AGE_COL] = pd.to_numeric(df[AGE_COL], errors="coerce")
+            if plan["dtypes"][AGE_COL] == "object":
+                df[AGE_COL] = df[AGE_COL].astype(float)
 
-    numeric_cols = df.select_dtypes(include=["int64", "float64"]).columns
-    for col in numeric_cols:
-        df[col] = df[col].fillna(df[col].median())
+        # Convert Sleep hours like "9 hours" -> 9
+        if SLEEP_COL in df.columns:
+            df[SLEEP_COL] = (
+                df[SLEEP_COL]
+                .astype(str)
+                .str.extract(r"(\d+)")  # extract digits
+                .astype(float)
+            )
 
-    categorical_cols = df.select_dtypes(include=["object"]).columns
-    for col in categorical_cols:
-        df[col] = df[col].fillna(df[col].mode()[0])
+        # Convert Deadlines/Exams to numeric
+        if DEADLINES_COL in df.columns:
+            df[DEADLINES_COL] = pd.to_numeric(df[DEADLINES_COL], errors="coerce").fillna(0)
+            if plan["dtypes"][DEADLINES_COL] == "object":
+                df[DEADLINES_COL] = df[DEADLINES_COL].astype(float)
 
-    print("\nMissing values after cleaning:\n", df.isnull().sum())
+        # Convert Timestamp
+        if "Timestamp" in df.columns:
+            raw = df["Timestamp"]
+            df["Timestamp"] = pd.to_datetime(raw, format=plan["timestamp_format"], errors="coerce")
+            unparsed = int((df["Timestamp"].isna() & raw.notna()).sum())
+            if unparsed:
+                print(f"⚠️ Timestamp: {unparsed} of {len(df)} values do not match "
+                      f"{plan['timestamp_format']!r}; stored as missing")
 
     # ---------------------------
-    # Step 3: Standardize Columns
+    # Step 4: Clean Multi-Choice Responses
     # ---------------------------
-    # Convert Age to numeric
-    if "Age (years)" in df.columns:
-        df["Age (years)"] = pd.to_numeric(df["Age (years)"], errors="coerce")
-
-    # Convert Sleep hours like "9 hours" -> 9
-    if "Average sleep hours per night (past 2 weeks)" in df.columns:
-        df["Average sleep hours per night (past 2 weeks)"] = (
-            df["Average sleep hours per night (past 2 weeks)"]
-            .astype(str)
-            .str.extract(r"(\d+)")  # extract digits
-            .astype(float)
-        )
-
-    # Convert Deadlines/Exams to numeric
-    if "How many deadlines/exams in the next 7 days?" in df.columns:
-        df["How many deadlines/exams in the next 7 days?"] = pd.to_numeric(
-            df["How many deadlines/exams in the next 7 days?"], errors="coerce"
-        ).fillna(0)
-
-    # Convert Timestamp
-    if "Timestamp" in df.columns:
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
+    with stage("step4_multi_choice"):
+        # Normalized "A, B" text plus a uint64 bitmask over the plan's option
+        # vocabulary, so downstream counts are bit sums rather than explodes
+        for col in MULTI_CHOICE_COLS:
+            if col in df.columns:
+                tokens = split_options(df[col])
+                df[col] = tokens.groupby(level=0).agg(", ".join).reindex(df.index, fill_value="")
+                if col in plan["options"]:
+                    df[mask_column(col)] = encode_options(tokens, plan["options"][col], df.index)
 
     # ---------------------------
-    # Step 4: Clean Multi-Choice Responses
+    # Step 5: Encode Likert Scale Responses
     # ---------------------------
-    multi_choice_cols = [
-        "Which wellness/mental health apps have you used in the last 6 months? (select all that apply)",
-        "Which emotions did you often experience in the last week? (select all that apply)"
-    ]
+    with stage("step5_likert"):
+        for col in LIKERT_COLS:
+            if col in df.columns:
+                # Map each distinct answer once; answers off the scale (and
+                # gaps, code -1 -> the trailing <NA>) become <NA>, not text
+                codes, answers = pd.factorize(df[col])
+                points = pd.array([_likert(a) for a in answers] + [None], dtype="Int8")
+                df[col] = pd.Series(points[codes], index=df.index)
 
-    for col in multi_choice_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).apply(
-                lambda x: [i.strip().title() for i in re.split(r",|;", x) if i.strip() != ""]
-            )
+    # ---------------------------
+    # Step 5b: Derived Metrics
+    # ---------------------------
+    with stage("step5b_derived"):
+        # Frequency answers become points through a lookup table (reversed
+        # for the reverse-scored items), summed into a composite stress
+        # score and banded into Low/Moderate/High
+        df = add_stress_metrics(df)
 
     # ---------------------------
-    # Step 5: Encode Likert Scale Responses
+    # Step 5c: Compact Typed Schema
     # ---------------------------
-    likert_map = {
-        "Strongly disagree": 1,
-        "Disagree": 2,
-        "Neutral": 3,
-        "Agree": 4,
-        "Strongly agree": 5
-    }
+    with stage("step5c_schema"):
+        df = apply_schema(df, plan["schema"])
+
+    return df
+
+
+# ---------------------------
+# Outputs & incremental state
+# ---------------------------
+def profile_chunks(file_path, chunksize):
+    """First pass of the streaming mode: one merged profile over every chunk"""
+    profile = None
+    for chunk in read_raw(file_path, chunksize=chunksize):
+        chunk_profile = profile_frame(chunk)
+        profile = chunk_profile if profile is None else merge_profiles(profile, chunk_profile)
+    return profile
+
+
+def clean_to_outputs(file_path, plan, output_file, chunksize=None, sqlite_file=None):
+    """Second pass: transform the raw file and write it, whole or chunk by chunk"""
+    if chunksize is None:
+        with stage("load"):
+            raw = read_raw(file_path)
+        with stage("transform", rows=len(raw)):
+            df = transform(raw, plan)
+        with stage("save"):
+            write_outputs(df, output_file, sqlite_file=sqlite_file)
+        return df.shape
+    rows = 0
+    for i, chunk in enumerate(read_raw(file_path, chunksize=chunksize)):
+        with stage("chunk", index=i, rows=len(chunk)):
+            with stage("transform"):
+                cleaned = transform(chunk, plan)
+            with stage("save"):
+                write_outputs(cleaned, output_file, append=i > 0, sqlite_file=sqlite_file)
+        rows += len(cleaned)
+    # Columns as written (derived score, level and multi-choice columns included)
+    return (rows, cleaned.shape[1])
+
+
+def prepare_outputs(df):
+    """The parts of a batch's outputs that depend on nothing else: its CSV rows, rollup rows and text index"""
+    return {"csv": df.to_csv(index=False, header=False, date_format="%Y-%m-%d %H:%M:%S"),
+            "rollups": rollup(df), "text": TextIndex().add(df)}
+
+
+def write_outputs(df, output_file, append=False, sqlite_file=None, prepared=None):
+    """Write cleaned rows to the CSV, the Parquet artifact, the text index, the rollups and (optionally) SQLite
+
+    prepared: prepare_outputs(df), when it was computed elsewhere (e.g. in a worker process)
+    """
+    if prepared is None:
+        prepared = prepare_outputs(df)
+    with open(output_file, "a" if append else "w", encoding="utf-8", newline="") as f:
+        if not append:
+            f.write(df.iloc[:0].to_csv(index=False))
+        f.write(prepared["csv"])
+    # Typed, columnar copy so EDA and the dashboard can read only the
+    # columns they use
+    write_columnar(df, CLEANED_PARQUET, append=append)
+    # Search index and term counts of the open-text answers, grown per batch
+    update_text_index(df, append=append, index=prepared["text"])
+    # Daily/weekly metric rollups behind the trend views, grown per batch
+    update_rollups(df, append=append, rows=prepared["rollups"])
+    # Indexed copy the dashboard can query without loading it
+    if sqlite_file:
+        write_sqlite(df, sqlite_file, append=append, text_index=prepared["text"])
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def raw_watermark(file_path):
+    """Position reached in the raw file plus digests to detect rewrites before it"""
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        f.seek(max(0, size - WATERMARK_WINDOW))
+        window = f.read(size - f.tell())
+    return {"offset": size, "header": _sha(header), "window": _sha(window),
+            "newline": window.endswith(b"\n")}
+
+
+def watermark_valid(watermark, file_path):
+    """True if file_path is the watermarked file with (possibly) rows appended"""
+    size = os.path.getsize(file_path)
+    offset = watermark["offset"]
+    if size < offset or not watermark["newline"]:
+        return False
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        start = max(0, offset - WATERMARK_WINDOW)
+        f.seek(start)
+        window = f.read(offset - start)
+    return _sha(header) == watermark["header"] and _sha(window) == watermark["window"]
+
+
+def read_tail(file_path, offset, end):
+    """Raw rows between byte offsets, parsed with the file's header"""
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read(end - offset)
+    return read_raw(io.BytesIO(header + tail))
+
+
+def load_state(state_file=STATE_FILE):
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, state_file=STATE_FILE):
+    tmp = state_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_file)
+
+
+def finish_run(file_path, watermark, profile, plan, state_file=STATE_FILE, sqlite_file=None):
+    """Persist what later runs and readers need: option vocabularies, schema and state"""
+    write_options(plan["options"])
+    write_schema(plan["schema"])
+    if sqlite_file:
+        write_sqlite_meta(plan["options"], plan["schema"], sqlite_file)
+    # A multi-file run records its files (and no watermark), so --incremental
+    # starts over from it
+    source = ([os.path.abspath(p) for p in file_path] if isinstance(file_path, list)
+              else os.path.abspath(file_path))
+    save_state({"version": STATE_VERSION, "source": source, "watermark": watermark,
+                "profile": profile, "plan": plan}, state_file)
+
+
+def clean_incremental(file_path=RAW_FILE, output_file=OUTPUT_FILE, state_file=STATE_FILE,
+                      chunksize=None, sqlite_file=None, workers=1):
+    """Clean only rows appended since the last run and append them to the outputs.
+
+    Falls back to a full run when there is no usable state, or when the new
+    rows shift anything already-cleaned rows depend on (dropped columns,
+    dtypes, or the median/mode used to fill their gaps). Only the new rows
+    are read and profiled; the state's profiles are bounded, so merging into
+    them does not grow with the rows cleaned before.
+    """
+    state = load_state(state_file)
+    if (state is None or state.get("version") != STATE_VERSION
+            or state.get("source") != os.path.abspath(file_path)
+            or not os.path.exists(output_file)
+            or (sqlite_file and not os.path.exists(sqlite_file))
+            or not watermark_valid(state["watermark"], file_path)):
+        print("No usable incremental state; cleaning from scratch.")
+        return main(file_path, output_file, state_file=state_file, chunksize=chunksize,
+                    sqlite_file=sqlite_file, workers=workers)
+
+    watermark = raw_watermark(file_path)
+    if watermark["offset"] == state["watermark"]["offset"]:
+        print("✅ No new responses since the last run.")
+        return
+
+    with stage("read_tail"):
+        tail = read_tail(file_path, state["watermark"]["offset"], watermark["offset"])
+    with stage("profile", rows=len(tail)):
+        profile = merge_profiles(state["profile"], profile_frame(tail))
+        plan = fit_plan(profile, state["plan"])
+
+    if plans_compatible(state["plan"], plan, state["profile"]):
+        with stage("transform", rows=len(tail)):
+            cleaned = transform(tail, plan)
+        with stage("save"):
+            write_outputs(cleaned, output_file, append=True, sqlite_file=sqlite_file)
+        print(f"\n✅ Appended {len(tail)} new responses to:", output_file)
+    else:
+        print("\nImputation state shifted; recleaning all", profile["rows"], "responses.")
+        with stage("reclean"):
+            clean_to_outputs(file_path, plan, output_file, chunksize, sqlite_file)
+        print("✅ Data cleaning complete. Saved as:", output_file, "and", CLEANED_PARQUET)
+
+    finish_run(file_path, watermark, profile, plan, state_file, sqlite_file)
+
+
+def clean_chunked(file_path=RAW_FILE, output_file=OUTPUT_FILE, state_file=STATE_FILE,
+                  chunksize=None, max_memory_mb=None, sqlite_file=None):
+    """Bounded-memory cleaning in two passes over the raw file.
+
+    Pass one merges chunk profiles (missing counts and value counters, which
+    give exact medians and modes); pass two transforms and writes chunk by
+    chunk. Output matches main() on the same input.
+    """
+    if chunksize is None:
+        chunksize = chunksize_for(file_path, max_memory_mb)
+    watermark = raw_watermark(file_path)
+
+    print("="*60)
+    print(f"Streaming {file_path} in chunks of {chunksize} rows")
+    with stage("profile_pass"):
+        profile = profile_chunks(file_path, chunksize)
+    print("Initial Shape:", (profile["rows"], len(profile["columns"])))
+    print("Columns:", list(profile["columns"]))
+    print("="*60)
+
+    missing = pd.Series({col: info["missing"] for col, info in profile["columns"].items()})
+    print("\nMissing values before cleaning:\n", missing)
+
+    plan = fit_plan(profile)
+    with stage("clean_pass"):
+        shape = clean_to_outputs(file_path, plan, output_file, chunksize, sqlite_file)
+    finish_run(file_path, watermark, profile, plan, state_file, sqlite_file)
+
+    print("\n✅ Data cleaning complete. Saved as:", output_file, "and", CLEANED_PARQUET)
+    print("Final Shape:", shape)
 
-    likert_cols = [
-        "I am concerned about privacy of my journals.",
-        "I prefer on-device processing even if features are limited.",
-        "I am okay with personalized nudges if they help my wellbeing.",
-        "I am willing to share anonymized analytics for research."
-    ]
 
-    for col in likert_cols:
-        if col in df.columns:
-            df[col] = df[col].map(likert_map).fillna(df[col])
+# ---------------------------
+# Multi-file ingestion
+# ---------------------------
+def input_files(source):
+    """Raw CSV files named by source: a file, a directory (its *.csv) or a glob, in sorted order"""
+    if os.path.isfile(source):
+        return [source]
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.csv")))
+    return sorted(glob.glob(source))
+
+
+def row_hashes(df, timestamp_format=None):
+    """Stable 128-bit identity of every row (timestamp and answers, in column order).
+
+    With timestamp_format, timestamps are compared as the times they parse
+    to, so one response exported in two regional formats still matches.
+    """
+    if timestamp_format and "Timestamp" in df.columns:
+        times = pd.to_datetime(df["Timestamp"], format=timestamp_format, errors="coerce")
+        df = df.assign(Timestamp=times.dt.strftime("%Y-%m-%d %H:%M:%S").where(times.notna(), df["Timestamp"]))
+    halves = [pd.util.hash_pandas_object(df, index=False, hash_key=key).to_numpy() for key in ROW_HASH_KEYS]
+    return np.column_stack(halves).view("V16").ravel()
+
+
+def first_occurrences(hashes):
+    """Mask of the rows whose hash has not appeared in an earlier row"""
+    keep = np.zeros(len(hashes), dtype=bool)
+    keep[np.unique(hashes, return_index=True)[1]] = True
+    return keep
+
+
+def _read_aligned(file_path, columns):
+    # Exports of different forms share one column order (and gaps where a form lacks a question)
+    return read_raw(file_path).reindex(columns=columns)
+
+
+def _hash_file(file_path, columns):
+    """Pass one over a file: its row hashes, and the profile of its rows without in-file repeats
+    (whose timestamp format is the file's own)"""
+    raw = _read_aligned(file_path, columns)
+    hashes = row_hashes(raw, timestamp_format(raw["Timestamp"]) if "Timestamp" in raw else None)
+    return hashes, profile_frame(raw[first_occurrences(hashes)])
+
+
+def _profile_file(file_path, columns, keep):
+    return profile_frame(_read_aligned(file_path, columns)[keep])
+
+
+def _clean_file(file_path, columns, keep, plan):
+    """Pass two over a file: its kept rows cleaned, with their prepare_outputs() ready to write"""
+    cleaned = transform(_read_aligned(file_path, columns)[keep], plan)
+    return cleaned, prepare_outputs(cleaned)
+
+
+def _ordered(pool, fn, jobs, window):
+    """fn(*job) of every job, in job order; on pool with at most window jobs in flight"""
+    if pool is None:
+        for job in jobs:
+            yield fn(*job)
+        return
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, *job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def clean_files(files, output_file=OUTPUT_FILE, state_file=STATE_FILE, workers=1, sqlite_file=None):
+    """Clean many raw exports into one output, parsing and cleaning files on a process pool.
+
+    Respondents are deduplicated across (and within) files by row hash,
+    keeping the first occurrence in sorted file order. Pass one hashes and
+    profiles every file; files that lost rows to an earlier file are
+    profiled again without them; pass two cleans each file's rows with the
+    merged plan (and prepares their CSV, rollup and text index rows), and
+    the main process writes them in file order. Each file is one batch,
+    and the output is the same for any number of workers.
+    """
+    if not files:
+        raise FileNotFoundError("No raw CSV files to clean")
+    columns = list(dict.fromkeys(col for path in files
+                                 for col in pd.read_csv(path, nrows=0, encoding="utf-8").columns))
+    window = 2 * workers
+
+    print("="*60)
+    print(f"Ingesting {len(files)} files on {workers} worker(s)")
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(files) > 1 else None
+    try:
+        with stage("hash_pass", files=len(files)):
+            passes = list(_ordered(pool, _hash_file, [(path, columns) for path in files], window))
+        hashes = [h for h, _ in passes]
+        keep = first_occurrences(np.concatenate(hashes))
+        keeps = np.split(keep, np.cumsum([len(h) for h in hashes])[:-1])
+        profiles = [profile for _, profile in passes]
+        # A file's first profile already leaves out its own repeats
+        redo = [i for i, k in enumerate(keeps) if k.sum() < profiles[i]["rows"]]
+        with stage("profile_pass", files=len(redo)):
+            jobs = [(files[i], columns, keeps[i]) for i in redo]
+            for i, profile in zip(redo, _ordered(pool, _profile_file, jobs, window)):
+                profiles[i] = profile
+        # Files keep their own timestamp formats (regional exports differ)
+        formats = [p["timestamp_format"] for p in profiles]
+        profile = reduce(merge_profiles, profiles)
+        print("Initial Shape:", (len(keep), len(columns)))
+        print("Duplicate responses dropped:", len(keep) - profile["rows"])
+        print("Columns:", columns)
+        print("="*60)
+
+        missing = pd.Series({col: info["missing"] for col, info in profile["columns"].items()})
+        print("\nMissing values before cleaning:\n", missing)
+
+        plan = fit_plan(profile)
+        rows = batches = width = 0
+        with stage("clean_pass"):
+            jobs = [(path, columns, k, dict(plan, timestamp_format=fmt or plan["timestamp_format"]))
+                    for path, k, fmt in zip(files, keeps, formats)]
+            for cleaned, prepared in _ordered(pool, _clean_file, jobs, window):
+                if len(cleaned) or not batches:
+                    with stage("save", rows=len(cleaned)):
+                        write_outputs(cleaned, output_file, append=batches > 0, sqlite_file=sqlite_file,
+                                      prepared=prepared)
+                    batches += 1
+                rows += len(cleaned)
+                width = cleaned.shape[1]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    finish_run(files, None, profile, plan, state_file, sqlite_file)
+
+    print("\n✅ Data cleaning complete. Saved as:", output_file, "and", CLEANED_PARQUET)
+    print("Final Shape:", (rows, width))
+
+
+def main(file_path=RAW_FILE, output_file=OUTPUT_FILE, state_file=STATE_FILE,
+         chunksize=None, max_memory_mb=None, sqlite_file=None, workers=1):
+    if not os.path.isfile(file_path):
+        return clean_files(input_files(file_path), output_file, state_file, workers, sqlite_file)
+    if chunksize is not None or max_memory_mb is not None:
+        return clean_chunked(file_path, output_file, state_file, chunksize, max_memory_mb, sqlite_file)
+
+    # ---------------------------
+    # Step 1: Load & Inspect Data
+    # ---------------------------
+    with stage("step1_load"):
+        watermark = raw_watermark(file_path)
+        df = read_raw(file_path)
+
+    print("="*60)
+    print("Initial Shape:", df.shape)
+    print("Columns:", df.columns.tolist())
+    print("="*60)
+
+    print("\nMissing values before cleaning:\n", df.isnull().sum())
+
+    with stage("profile", rows=len(df)):
+        profile = profile_frame(df)
+        plan = fit_plan(profile)
+    with stage("transform", rows=len(df)):
+        df = transform(df, plan)
+
+    print("\nMissing values after cleaning:\n", df.isnull().sum())
 
     # ---------------------------
     # Step 6: Save Cleaned Dataset
     # ---------------------------
-    output_file = "wellbeing_survey_res_Cleaned.csv"
-    df.to_csv(output_file, index=False, encoding="utf-8")
+    with stage("step6_save"):
+        write_outputs(df, output_file, sqlite_file=sqlite_file)
+        finish_run(file_path, watermark, profile, plan, state_file, sqlite_file)
 
-    print("\n✅ Data cleaning complete. Saved as:", output_file)
+    print("\n✅ Data cleaning complete. Saved as:", output_file, "and", CLEANED_PARQUET)
     print("Final Shape:", df.shape)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean the wellbeing survey export.")
+    parser.add_argument("--input", dest="file_path", default=RAW_FILE,
+                        help="raw CSV export, or a directory or glob of exports to merge")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing and cleaning input files in parallel (0 = one per CPU)")
+    parser.add_argument("--output", dest="output_file", default=OUTPUT_FILE)
+    parser.add_argument("--state", dest="state_file", default=STATE_FILE)
+    parser.add_argument("--incremental", action="store_true",
+                        help="only clean rows appended since the last run")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the input in chunks of this many rows")
+    parser.add_argument("--max-memory-mb", type=float, default=None,
+                        help="stream the input in chunks sized to stay under this memory ceiling")
+    parser.add_argument("--sqlite", dest="sqlite_file", nargs="?", const=CLEANED_SQLITE, default=None,
+                        help="also write an indexed SQLite copy (for SURVEY_BACKEND=sqlite)")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, default=None,
+                        help="append per-stage timings as JSON lines to this file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record tracemalloc peaks per stage (slower)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.trace:
+        configure_trace(args.trace, memory=args.trace_memory)
+    workers = args.workers or os.cpu_count()
+    chunksize = args.chunksize
+    if chunksize is None and args.max_memory_mb is not None and os.path.isfile(args.file_path):
+        chunksize = chunksize_for(args.file_path, args.max_memory_mb)
+    if args.incremental:
+        clean_incremental(args.file_path, args.output_file, args.state_file, chunksize, args.sqlite_file,
+                          workers)
+    else:
+        main(args.file_path, args.output_file, args.state_file, chunksize, sqlite_file=args.sqlite_file,
+             workers=workers)